@@ -1,71 +1,102 @@
 # imports Go Annotation to atomese
-# Requires: file gene_association.goa_ref_human.gz from http://geneontology.org/gene-associations/gene_association.goa_ref_human.gz
+# Requires: file goa_human.gaf.gz from http://current.geneontology.org/annotations/goa_human.gaf.gz
+# Writes the gene level annotations and the uniprot to GO mapping (see uniprot2GO.py) in one pass
 import wget
-import gzip
 import os
+import argparse
 import metadata
 from datetime import date
 from atomwrappers import *
-import pandas as pd
-import json
+import current_symbols
 import find_gons
+import gaf
 
 source = "http://current.geneontology.org/annotations/goa_human.gaf.gz"
-if not os.path.exists("raw_data/goa_human.gaf.gz"):
-    dataset = wget.download(source, "raw_data")
-with gzip.open("raw_data/goa_human.gaf.gz", "rb") as f:
-    lines = f.readlines()
-lines = [l.decode("utf-8") for l in lines]
-line_no = []
+gaf_file = "raw_data/goa_human.gaf.gz"
+script = "https://github.com/MOZI-AI/knowledge-import/GO_Annotation_scm.py"
+uniprot_script = "https://github.com/MOZI-AI/knowledge-import/uniprot2GO.py"
+columns = ["db", "db_object_id", "db_object_symbol", "go_id", "db_object_name"]
 
-with open("raw_data/go-namespace.json", "r") as ns:
-    go_namespace = json.load(ns)
-init_namespace = len(go_namespace)
+def download(path=gaf_file):
+    if not os.path.exists(path):
+        wget.download(source, os.path.dirname(path))
+    return path
 
-for num, line in enumerate(lines , 1):
-  if "UniProtKB" in line :
-      line_no.append(num)
+def import_gaf(path, scm_output=None, scm_gene_level=None, scm_proteins=None):
+    """
+    Convert the annotations of a GAF file in a single streaming pass
 
-lines_annotate = lines[line_no[0] -1 : len(lines)]
+    scm_output and scm_gene_level get the gene to GO memberships (scm_output
+    with the gene names), scm_proteins the UniProtKB to GO memberships.
+    Any of them can be None. Returns the sets of genes, proteins and GO terms.
+    """
+    go_namespace = find_gons.load_namespace().preload()
+    # ask QuickGO once for the terms that are not in go.obo
+    find_gons.prefetch((r.go_id for r in gaf.read_gaf(path, ["go_id"])), go_namespace)
 
-#open file to write
-if not os.path.exists(os.path.join(os.getcwd(), 'gene-level')):
-      os.makedirs('gene-level')
-if not os.path.exists(os.path.join(os.getcwd(), 'dataset')):
-      os.makedirs('dataset') 
-scm_output = open('dataset/GO_annotation_{}.scm'.format(str(date.today())), 'w')
-scm_gene_level = open('gene-level/GO_annotation_gene-level_{}.scm'.format(str(date.today())), 'w')
+    if scm_output:
+        #add GOC Validation Date
+        # each line keeps its newline unless cut at "$", like the raw file lines did
+        first, second = [(line + "\n").split('!')[0].split('$')[0] for line in gaf.read_header(path)[:2]]
+        scm_output.write(";" + first + "\n")
+        scm_output.write(";" + second + "\n\n")
 
-#add GOC Validation Date
-scm_output.write(";"+((lines[0]).split('!')[1]).split('$')[0]+ "\n")
-scm_output.write(";"+((lines[1]).split('!')[1]).split('$')[0]+ "\n\n")
+    genes = set()
+    proteins = set()
+    go = set()
+    for db, db_object_id, gene_symbol, go_id, gene_name in gaf.read_gaf(path, columns):
+        go_namespace, go_ns = find_gons.find_type(go_id, go_namespace)
+        if go_ns:
+            member = CMemberLink(CGeneNode(gene_symbol.upper()), go_ns)
+            for f in (scm_output, scm_gene_level):
+                if f:
+                    write_atoms(f, member)
+            go.add(go_id)
+        else:
+            print("Unknown namespace: {}".format(go_id))
+        if scm_output and not gene_symbol in genes:
+            eval_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(CGeneNode(gene_symbol), CConceptNode(gene_name)))
+            write_atoms(scm_output, eval_name)
+        genes.add(gene_symbol)
+        if scm_proteins and db == "UniProtKB":
+            if go_ns:
+                write_atoms(scm_proteins, CMemberLink(ProteinNode(db_object_id), go_ns))
+            proteins.add(db_object_id)
+    return genes, proteins, go
 
-genes = []
-go = []
-#loop through lines
-for l in lines_annotate:
-    gene_symbol =l.split('\t')[2]
-    go_id = (l.split('\t')[4])
-    gene_name = l.split('\t')[9]
-    go_namespace, go_ns = find_gons.find_type(go_id, go_namespace)
-    if go_ns:
-        member = CMemberLink(CGeneNode(gene_symbol.upper()), go_ns)
-        scm_output.write(member.recursive_print() + "\n")
-        scm_gene_level.write(member.recursive_print() + "\n")
-        go.append(go_id)
-    else: 
-        print("Unknown namespace: {}".format(go_id))
-    if not gene_symbol in genes:
-        genes.append(gene_symbol)
-        eval_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(CGeneNode(gene_symbol), CConceptNode(gene_name)))
-        scm_output.write(eval_name.recursive_print() + "\n")
-scm_output.close()
-scm_gene_level.close()
+def parse_args():
+    parser = argparse.ArgumentParser(description='convert the GO annotations of human genes and proteins to atomese')
+    parser.add_argument('--gaf', type=str, default='',
+                        help='path to a GAF 2.x file (default: download {})'.format(source))
+    parser.add_argument('--no-proteins', action='store_true',
+                        help='skip the uniprot to GO output')
+    current_symbols.add_arguments(parser)
+    return parser.parse_args()
 
-if len(go_namespace) > init_namespace:
-    with open("raw_data/go-namespace.json", "w") as ns:
-        json.dump(go_namespace, ns, indent=2)
+if __name__ == "__main__":
+    """
+    usage:
+        python GO_Annotation_scm.py
+        python GO_Annotation_scm.py --gaf raw_data/goa_human.gaf.gz --no-proteins
+    """
+    arguments = parse_args()
+    current_symbols.configure(arguments)
+    path = arguments.gaf or download()
 
-script = "https://github.com/MOZI-AI/knowledge-import/GO_Annotation_scm.py"
-metadata.update_meta("GO_Annotation:latest", source,script,genes=len(genes), goterms={"go-terms":len(set(go))})
-print("Done, check dataset/GO_annotation.scm and gene-level/GO_annotation.scm")
\ No newline at end of file
+    #open file to write
+    for directory in ['gene-level', 'dataset']:
+        if not os.path.exists(os.path.join(os.getcwd(), directory)):
+            os.makedirs(directory)
+    scm_output = open('dataset/GO_annotation_{}.scm'.format(str(date.today())), 'w')
+    scm_gene_level = open('gene-level/GO_annotation_gene-level_{}.scm'.format(str(date.today())), 'w')
+    scm_proteins = None if arguments.no_proteins else open("dataset/uniprot2GO_{}.scm".format(str(date.today())), 'w')
+    print("\nStarted importing")
+    genes, proteins, go = import_gaf(path, scm_output, scm_gene_level, scm_proteins)
+    scm_output.close()
+    scm_gene_level.close()
+
+    metadata.update_meta("GO_Annotation:latest", source,script,genes=len(genes), goterms={"go-terms":len(go)})
+    if scm_proteins:
+        scm_proteins.close()
+        metadata.update_meta("Uniprot-GO:latest", source,uniprot_script,prot=len(proteins), goterms={"go-terms":len(go)})
+    print("Done, check dataset/GO_annotation.scm and gene-level/GO_annotation.scm")
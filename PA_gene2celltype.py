@@ -2,6 +2,7 @@ import argparse
 import wget
 import pandas as pd
 import datetime
+import current_symbols
 from atomwrappers import *
 
 # source: https://www.proteinatlas.org/download/normal_tissue.tsv.zip
@@ -14,6 +15,7 @@ def parse_args():
                         help='the source data file')
     parser.add_argument('--output_file', type=str, default='',
                         help='output file')
+    current_symbols.add_arguments(parser)
     return parser.parse_args()
 
 def preprocess(mapping_file):
@@ -53,22 +55,27 @@ def gene2anatomy(dbsource, mapping_file, output_file):
     genes = df["Gene name"]
     genes = [g.split(".")[0].upper() for g in genes]
     df["Gene name"] = genes
-    cell_types = []
+    cell_types = set()
+    # the same gene - cell type pair is listed for several tissues
+    atoms = AtomTable()
 
     for r,v in merged_df.iterrows():
         gene = v["Gene name"]
         cl_id = v["cl_id"]
         cl_name = v["cl_name"]
         if not cl_id == "N/A":
-            member = CMemberLink(CGeneNode(gene), find_type(cl_id))
-            output_file.write(member.recursive_print() + "\n") 
+            atoms.add(CMemberLink(CGeneNode(gene), find_type(cl_id)))
             if not cl_id in cell_types:
-                cell_types.append(cl_id)           
+                cell_types.add(cl_id)
                 name = CEvaluationLink(CPredicateNode("has_name"), CListLink(find_type(cl_id), CConceptNode(cl_name)))
-                output_file.write(name.recursive_print() + "\n")
+                atoms.add(name)
+    atoms.flush(output_file)
+    for atom_type, (added, unique) in atoms.stats().items():
+        print("{0}: {1} unique of {2}".format(atom_type, unique, added))
 
 def main():
     args = parse_args()
+    current_symbols.configure(args)
     if(not(args.dbsource)):
         dbsource = wget.download("https://www.proteinatlas.org/download/normal_tissue.tsv.zip", "raw_data/")
     else:
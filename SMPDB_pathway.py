@@ -59,12 +59,12 @@ def import_metabolites(gene_level=False):
                     if chebi_id: 
                         chebi_id= "ChEBI:" + chebi_id 
                     member = CMemberLink(ChebiNode(chebi_id), SMPNode(smpdb_id))
-                    f.write(member.recursive_print() + "\n")
+                    write_atoms(f, member)
                     if gene_level:
-                        g.write(member.recursive_print() + "\n")
+                        write_atoms(g, member)
                     if not chebi_id in chebis:
                         ch_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(ChebiNode(chebi_id), CConceptNode(chebi_name)))
-                        f.write(ch_name.recursive_print() + "\n")
+                        write_atoms(f, ch_name)
                         chebis.append(chebi_id)
                     if not smpdb_id in pathways:
                         pathways.append(smpdb_id)
@@ -105,18 +105,18 @@ def import_proteins(gene_level=False):
                 smpdb_name = filter_nan(str(data.iloc[r]['Pathway Name']).strip())
                 try:
                     member = CMemberLink(CGeneNode(gene), SMPNode(smpdb_id))
-                    f.write(member.recursive_print() + "\n")
+                    write_atoms(f, member)
                     expression = CEvaluationLink(CPredicateNode("expresses"), CListLink(CGeneNode(gene), ProteinNode(protein)))
-                    f.write(expression.recursive_print() + "\n")                    
+                    write_atoms(f, expression)
                     if gene_level:
-                        g.write(member.recursive_print() + "\n")
+                        write_atoms(g, member)
                     if not smpdb_id in pathways:
                         smp_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(SMPNode(smpdb_id), CConceptNode(smpdb_name)))
-                        f.write(smp_name.recursive_print() + "\n")
+                        write_atoms(f, smp_name)
                         pathways.append(smpdb_id)
                     if not protein in proteins:
                         prot_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(ProteinNode(protein), CConceptNode(protein_name)))
-                        f.write(prot_name.recursive_print() + "\n")
+                        write_atoms(f, prot_name)
                         proteins.append(protein)
                     if not gene in genes:
                         genes.append(gene)
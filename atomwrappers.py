@@ -4,32 +4,156 @@ Classes to generate atomese without working with atomspace
 __author__ = "Anatoly Belikov"
 __email__ = "abelikov@singularitynet.io"
 
+import io
+import sys
+from collections import Counter
 from current_symbols import *
 
 class CAtom:
+    """
+    Atoms are immutable once built: the structural hash is computed in the
+    constructor and reused for every dict/set operation.
+    """
+    __slots__ = ('_hash',)
+
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, CAtom) or self._hash != other._hash:
+            return False
+        return self._key() == other._key()
+
+    def write_to(self, fp, indent=''):
+        """
+        Write the atom to a file-like object, same output as recursive_print
+
+        Uses an explicit stack instead of recursion, entries are either
+        (atom, indent) pairs or literal strings to write.
+        """
+        stack = [(self, indent)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                fp.write(item)
+                continue
+            atom, indent = item
+            if not isinstance(atom, CLink):
+                fp.write(indent + str(atom))
+                continue
+            if atom.stv is not None:
+                fp.write(indent + '({0} {1}'.format(atom.atom_type, atom.stv))
+            else:
+                fp.write(indent + '({0}'.format(atom.atom_type))
+            stack.append(')')
+            indent = indent + '    '
+            for x in reversed(atom.outgoing):
+                stack.append((x, indent))
+                stack.append('\n')
+
+    def recursive_print(self, result='', indent=''):
+        out = io.StringIO()
+        self.write_to(out, indent)
+        return result + out.getvalue()
+
+
+def write_atoms(fp, *atoms):
+    """
+    Write atoms to fp, one per line
+    """
+    for atom in atoms:
+        atom.write_to(fp)
+        fp.write('\n')
+
+
+class AtomTable:
+    """
+    Hash-consing table of atoms, a minimal in-memory AtomSpace
+
+    add() returns the canonical instance for an atom, sharing subatoms
+    between all links added to the table. Only atoms passed to add() are
+    written by flush(), each of them once.
+    """
+    def __init__(self):
+        self.atoms = dict()
+        self.roots = set()
+        self.pending = []
+        self.seen = Counter()
+        self.unique = Counter()
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __contains__(self, atom):
+        return atom in self.roots
+
+    def canonical(self, atom):
+        found = self.atoms.get(atom)
+        if found is not None:
+            return found
+        if isinstance(atom, CLink):
+            outgoing = tuple(self.canonical(x) for x in atom.outgoing)
+            if any(x is not y for x, y in zip(outgoing, atom.outgoing)):
+                # atoms are immutable, build an equal link over the shared subatoms
+                atom = type(atom)(*outgoing, stv=atom.stv)
+        self.atoms[atom] = atom
+        return atom
+
+    def add(self, atom):
+        self.seen[atom.atom_type] += 1
+        atom = self.canonical(atom)
+        if atom not in self.roots:
+            self.roots.add(atom)
+            self.pending.append(atom)
+            self.unique[atom.atom_type] += 1
+        return atom
+
+    def update(self, atoms):
+        for atom in atoms:
+            self.add(atom)
+
+    def flush(self, fp):
+        """
+        Write the unique atoms added since the previous flush
+        """
+        write_atoms(fp, *self.pending)
+        self.pending = []
+
+    def stats(self):
+        """
+        atom type: (added, unique) pairs
+        """
+        return {atom_type: (self.seen[atom_type], self.unique[atom_type]) for atom_type in self.seen}
 
 
 class CNode(CAtom):
+    __slots__ = ('name',)
     atom_type = None
     def __init__(self, name):
-        self.name = name
+        self.name = sys.intern(name) if type(name) is str else name
+        self._hash = hash(self._key())
+
+    def _key(self):
+        return (self.atom_type, self.name)
 
     def __str__(self):
         return '({0} "{1}")'.format(self.atom_type, self.name.replace('"', '\\"')) 
 
-    def recursive_print(self, result='', indent=''):
-        return result + indent + str(self)
-
 
 
 class CLink(CAtom):
+    __slots__ = ('outgoing', 'stv')
     def __init__(self, *atoms, stv=None):
         self.outgoing = atoms
         for atom in atoms:
             assert isinstance(atom, CAtom)
         self.stv = stv
+        self._hash = hash(self._key())
+
+    def _key(self):
+        return (self.atom_type, None if self.stv is None else str(self.stv), self.outgoing)
 
 
     def __str__(self):
@@ -39,133 +163,159 @@ class CLink(CAtom):
 
         return '({0} {1})'.format(self.atom_type, outgoing)
 
-    def recursive_print(self, result='', indent=''):
-        if self.stv is not None:
-            result += indent + '({0} {1}'.format(self.atom_type, self.stv)
-            indent = indent + '    '
-            for x in self.outgoing:
-                result = x.recursive_print(result + '\n', indent)
-            result += ')'
-            return result
-        else:
-            result += indent + '({0}'.format(self.atom_type)
-            indent = indent + '    '
-            for x in self.outgoing:
-                result = x.recursive_print(result + '\n', indent)
-            result += ')'
-            return result
-
 
 class CEvaluationLink(CLink):
+    __slots__ = ()
     atom_type = 'EvaluationLink'
 
 class CExecutionLink(CLink):
+    __slots__ = ()
     atom_type = 'ExecutionLink'
 
 class CLazyExecutionOutputLink(CLink):
+    __slots__ = ()
     atom_type = 'LazyExecutionOutputLink'
 
 class CQuantitativePredicateLink(CLink):
+    __slots__ = ()
     atom_type = 'QuantitativePredicateLink'
 
 class CPredicateNode(CNode):
+    __slots__ = ()
     atom_type = 'PredicateNode'
 
 class CSchemaNode(CNode):
+    __slots__ = ()
     atom_type = 'SchemaNode'
 
 class CQuantitativeSchemaNode(CNode):
+    __slots__ = ()
     atom_type = 'QuantitativeSchemaNode'
 
 class CQuantitativePredicateNode(CNode):
+    __slots__ = ()
     atom_type = 'QuantitativePredicateNode'
 
 class CConceptNode(CNode):
+    __slots__ = ()
     atom_type = 'ConceptNode'
 
 class CNumberNode(CNode):
+    __slots__ = ()
     atom_type = 'NumberNode'
 
 class CMoleculeNode(CNode):
+    __slots__ = ()
     atom_type = 'MoleculeNode'
 
 class CMemberLink(CLink):
+    __slots__ = ()
     atom_type = 'MemberLink'
 
 class CListLink(CLink):
+    __slots__ = ()
     atom_type = 'ListLink'
 
 class CGeneNode(CNode):
+    __slots__ = ()
+    atom_type = 'GeneNode'
     def __init__(self, name):
-        self.name = get_current_symbol(name)
-        self.atom_type = 'GeneNode'
+        super().__init__(get_current_symbol(name))
 
 class CContextLink(CLink):
+    __slots__ = ()
     atom_type = 'ContextLink'
 
 class CInheritanceLink(CLink):
+    __slots__ = ()
     atom_type = 'InheritanceLink'
 
 class CRNANode(CNode):
+    __slots__ = ()
     atom_type = 'EnstNode'
 
 class NcRNANode(CNode):
+    __slots__ = ()
     atom_type = 'RefseqNode'
 
 class ChebiNode(CNode):
+    __slots__ = ()
     atom_type = 'ChebiNode'
 
 class ProteinNode(CNode):
+    __slots__ = ()
     atom_type = 'UniprotNode'
 
 class PubchemNode(CNode):
+    __slots__ = ()
     atom_type = 'PubchemNode'
 
 class ReactomeNode(CNode):
+    __slots__ = ()
     atom_type = 'ReactomeNode'
 
 class SMPNode(CNode):
+    __slots__ = ()
     atom_type = 'SmpNode'
 
 class PharmGkbNode(CNode):
+    __slots__ = ()
     atom_type = 'PharmGkbNode'
 
 class CelltypeNode(CNode):
+    __slots__ = ()
     atom_type = 'CellNode'
 
 class UberonNode(CNode):
+    __slots__ = ()
     atom_type = 'UberonNode'
 
 class GoCCNode(CNode):
+    __slots__ = ()
     atom_type = 'CellularComponentNode'
 
 class GoMFNode(CNode):
+    __slots__ = ()
     atom_type = 'MolecularFunctionNode'
 
 class GoBPNode(CNode):
+    __slots__ = ()
     atom_type = 'BiologicalProcessNode'
 
 class ChebiOntology(CNode):
+    __slots__ = ()
     atom_type = 'ChebiOntology'
 
 class NcbiTaxonomy(CNode):
+    __slots__ = ()
     atom_type = 'NcbiTaxonomyNode'
 
 class CPatientNode(CNode):
+    __slots__ = ()
     atom_type = 'PatientNode'
 
 class Entrez(CNode):
+    __slots__ = ()
     atom_type = 'EntrezNode'
 
 class CSetLink(CLink):
+    __slots__ = ('canonical',)
     atom_type = 'SetLink'
 
+    def __init__(self, *atoms, stv=None):
+        # unordered link: equality, hash and str use the outgoing set sorted once here
+        self.canonical = tuple(sorted(atoms, key=str))
+        super().__init__(*atoms, stv=stv)
+
+    def _key(self):
+        return (self.atom_type, None if self.stv is None else str(self.stv), self.canonical)
+
     def __str__(self):
-        # str is used for hash computation, so need to sort outgoing set for all unordered links
-        outgoing = '\n'.join(sorted([str(x) for x in self.outgoing]))
+        outgoing = '\n'.join([str(x) for x in self.canonical])
         return '({0} {1})'.format(self.atom_type, outgoing)
 
 class CStv:
+    __slots__ = ('tv', 'confidence')
     def __init__(self, tv, confidence):
         self.tv = tv
         self.confidence = confidence
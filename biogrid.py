@@ -10,19 +10,84 @@ __email__ = "hedra@singularitynet.io"
 # Or any of the latest version with the same type
 
 import argparse
+import numpy as np
 import pandas as pd
-from urllib.request import urlopen
+from urllib.request import urlopen, Request
 from zipfile import ZipFile
-from io import BytesIO
 import os
-import collections
+import shutil
 import metadata
+import current_symbols
+import incremental
 from datetime import date
 from atomwrappers import *
 
 
 
-def import_data_from_web(version, form='tab2'):
+# bump when the conversion changes, so incremental imports don't skip unchanged input
+converter_version = 1
+
+COLUMNS = ['Entrez Gene Interactor A', 'Entrez Gene Interactor B', 'Official Symbol Interactor A',
+           'Official Symbol Interactor B']
+
+
+def pubmed_column(form):
+    if form == 'tab2':
+        return 'Pubmed ID'
+    elif form == 'tab3':
+        return 'Publication Source'
+    raise RuntimeError("format {0} is not yet supported".format(form))
+
+
+def download(source, path):
+    """
+    Download source to path through a .part spool file
+
+    An interrupted download is resumed with a Range request on the next run. The ETag
+    (or Last-Modified) of the response is kept in <path>.part.validator and sent as
+    If-Range, so a .part of an older release (e.g. of the LATEST archive) is started over.
+    """
+    part = path + '.part'
+    validator = part + '.validator'
+    offset = 0
+    headers = {}
+    if os.path.exists(part) and os.path.exists(validator):
+        offset = os.path.getsize(part)
+        with open(validator) as f:
+            headers = {'Range': 'bytes={0}-'.format(offset), 'If-Range': f.read()}
+    with urlopen(Request(source, headers=headers)) as response:
+        if offset and response.status != 206:
+            # the server ignored the range or the file changed, start over
+            offset = 0
+        etag = response.headers.get('ETag')
+        stamp = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+        if not offset:
+            if stamp:
+                with open(validator, 'w') as f:
+                    f.write(stamp)
+            elif os.path.exists(validator):
+                os.remove(validator)
+        with open(part, 'ab' if offset else 'wb') as out:
+            shutil.copyfileobj(response, out, 1 << 20)
+    os.replace(part, path)
+    if os.path.exists(validator):
+        os.remove(validator)
+    return path
+
+
+def input_state(paths, version, form):
+    """
+    Fingerprint of an incremental import: input files, release, format, converter and HGNC snapshot
+    """
+    return incremental.fingerprint(paths, version, form, converter_version, current_symbols.snapshot_id())
+
+
+def read_chunks(fileobj, form, chunksize):
+    return pd.read_csv(fileobj, delimiter='\t', usecols=COLUMNS + [pubmed_column(form)],
+                       dtype=str, chunksize=chunksize)
+
+
+def import_data_from_web(version, form='tab2', chunksize=0, delta=False):
     if form not in ('tab2', 'tab3'):
         raise RuntimeError("format {0} is not supported".format(form))
     if version:
@@ -32,43 +97,107 @@ def import_data_from_web(version, form='tab2'):
         source = 'https://downloads.thebiogrid.org/Download/BioGRID/Latest-Release/BIOGRID-ORGANISM-LATEST.{0}.zip'.format(
             form)
     print("Started downloading the source:\n {0}".format(source))
+    archive = os.path.join('raw_data', source.split('/')[-1])
     try:
-        thefile = urlopen(source)
-        extracted_files = ZipFile(BytesIO(thefile.read()))
+        # a release archive never changes, the latest one is downloaded again
+        if not (version and os.path.isfile(archive)):
+            download(source, archive)
+        extracted_files = ZipFile(archive)
         if version:
             dataset = 'BIOGRID-ORGANISM-Homo_sapiens-' + version + '.{0}.txt'.format(form)
         else:
             dataset = [i for i in extracted_files.namelist() if "BIOGRID-ORGANISM-Homo_sapiens" in i][0]
             version = dataset.split('-')[-1].replace(".{0}.txt".format(form), "")
+        state = input_state([archive], version, form) if delta else None
+        if state and incremental.unchanged('biogrid', state):
+            return
+        if chunksize:
+            # parse the archive member directly, the archive itself is kept in raw_data
+            with extracted_files.open(dataset) as member:
+                import_data(read_chunks(member, form, chunksize), source, version, gene_level=True, form=form, state=state)
+            return
         data = pd.read_csv(extracted_files.open(dataset), low_memory=False, delimiter='\t')
     except:
         print("Error processing biogrid version {0}".format(version))
         raise
-    import_data(data, source, version, gene_level=True, form=form)
+    import_data(data, source, version, gene_level=True, form=form, state=state)
     data.to_csv("raw_data/" + dataset, sep='\t', index=False)
 
 
-def import_local_data(file, form='tab2'):
+def import_local_data(file, form='tab2', chunksize=0, delta=False):
     path = os.path.abspath(file)
     if os.path.isfile(path):
         try:
-            data = pd.read_csv(path, low_memory=False, delimiter='\t')
             version = file.split('-')[-1].replace(".{0}.txt".format(form), "")
-            import_data(data, path, version, gene_level=False, form=form)
+            state = input_state([path], version, form) if delta else None
+            if state and incremental.unchanged('biogrid', state):
+                return
+            if chunksize:
+                data = read_chunks(path, form, chunksize)
+            else:
+                data = pd.read_csv(path, low_memory=False, delimiter='\t')
+            import_data(data, path, version, gene_level=False, form=form, state=state)
         except Exception as e:
             print(e)
 
 
-def import_data(data, source, version, gene_level=False, form='tab2'):
+def as_text(column):
+    """
+    Column values as str, a missing cell becomes 'nan' like str() of the cell
+    """
+    return column.astype(str).fillna('nan').to_numpy(dtype=object)
+
+
+def convert_chunk(data, pubsource, f, genes, entrez_seen, pairs):
+    """
+    Write has_entrez_id links for new genes in a chunk and collect its PubMed ids per pair
+
+    genes, entrez_seen and pairs carry the state between chunks.
+    """
+    data = data.dropna(subset=['Official Symbol Interactor A', 'Official Symbol Interactor B'])
+    symbol_a = data['Official Symbol Interactor A'].astype(str).str.upper().str.strip().to_numpy(dtype=object)
+    symbol_b = data['Official Symbol Interactor B'].astype(str).str.upper().str.strip().to_numpy(dtype=object)
+    # one GeneNode per distinct symbol instead of one per row and interactor
+    for symbol in pd.unique(np.concatenate([symbol_a, symbol_b])):
+        if symbol not in genes:
+            genes[symbol] = CGeneNode(symbol)
+
+    # interleave interactors row by row (A1, B1, A2, B2, ...) to keep the first-seen order of entrez ids
+    entrez = pd.DataFrame({
+        'symbol': np.column_stack([symbol_a, symbol_b]).ravel(),
+        'entrez': np.column_stack([as_text(data['Entrez Gene Interactor A']),
+                                   as_text(data['Entrez Gene Interactor B'])]).ravel()})
+    entrez = entrez.drop_duplicates(subset='symbol')
+    entrez = entrez[~entrez['symbol'].isin(entrez_seen)]
+    for symbol, entrez_id in zip(entrez['symbol'], entrez['entrez']):
+        eval_ln = CEvaluationLink(CPredicateNode("has_entrez_id"), CListLink(genes[symbol], Entrez(entrez_id)))
+        write_atoms(f, eval_ln)
+        entrez_seen.add(symbol)
+
+    # unordered pairs are keyed by the (greater, smaller) symbols
+    greater = symbol_a > symbol_b
+    grouped = pd.DataFrame({
+        'first': np.where(greater, symbol_a, symbol_b),
+        'second': np.where(greater, symbol_b, symbol_a),
+        'pubmed': as_text(data[pubsource])})
+    grouped = grouped.groupby(['first', 'second'], sort=False)['pubmed'].agg(list)
+    for pair, pubmed in grouped.items():
+        if pair in pairs:
+            pairs[pair].extend(pubmed)
+        else:
+            pairs[pair] = pubmed
+
+
+def import_data(data, source, version, gene_level=False, form='tab2', state=None):
+    """
+    data is either a DataFrame or an iterable of DataFrame chunks
+
+    state is the input fingerprint of an incremental import, see incremental.py
+    """
     # Set the gene_level to True to get only the GGI without extra entrez and pubmedID info
-    if form == 'tab2':
-        pubsource = 'Pubmed ID'
-    elif form == 'tab3':
-        pubsource = 'Publication Source'
-    else:
-        raise RuntimeError("format {0} is not yet supported".format(form))
-    data = data[['Entrez Gene Interactor A', 'Entrez Gene Interactor B', 'Official Symbol Interactor A',
-                 'Official Symbol Interactor B', pubsource]]
+    pubsource = pubmed_column(form)
+    if isinstance(data, pd.DataFrame):
+        data = [data]
     print("started importing")
     dataset_path = os.path.join(os.getcwd(), 'dataset')
     if not os.path.exists(dataset_path):
@@ -77,60 +206,44 @@ def import_data(data, source, version, gene_level=False, form='tab2'):
     if gene_level:
         if not os.path.exists(os.path.join(os.getcwd(), 'gene-level')):
             os.makedirs('gene-level')
-        g = open('gene-level/biogrid_gene_gene_' + version + "_gene-level_" + str(date.today()) + '.scm', 'w')
+        gene_level_path = 'gene-level/biogrid_gene_gene_' + version + "_gene-level_" + str(date.today()) + '.scm'
+        g = open(gene_level_path, 'w')
 
+    genes = dict()
+    pairs = dict()
     biogrid_path = os.path.join(dataset_path, 'biogrid_gene_gene_' + version + '_' + str(date.today()) + '.scm')
     with open(biogrid_path, 'w') as f:
-        pairs = collections.defaultdict(list)
-        entrez = []
-        for i in range(len(data)):
-            if not (pd.isnull(data.iloc[i]['Official Symbol Interactor A']) or pd.isnull(
-                    data.iloc[i]['Official Symbol Interactor B'])):
-                node1 = str(data.iloc[i]['Official Symbol Interactor A']).upper().strip()
-                node2 = str(data.iloc[i]['Official Symbol Interactor B']).upper().strip()
-                gene_1 = CGeneNode(node1)
-                gene_2 = CGeneNode(node2)
-                pubmed = data.iloc[i][pubsource]
-                if node1 > node2:
-                    interactors = node1 + ':' + node2
-                else:
-                    interactors = node2 + ':' + node1
-
-                pubmed_link = 'https://www.ncbi.nlm.nih.gov/pubmed/?term=' + str(pubmed)
-                pairs[interactors].append(CConceptNode(pubmed_link))
-
-                if not node1 in entrez:
-                    entrez_1 = Entrez(str(data.iloc[i]['Entrez Gene Interactor A']))
-                    eval_ln = CEvaluationLink(CPredicateNode("has_entrez_id"), CListLink(gene_1, entrez_1))
-                    f.write(eval_ln.recursive_print() + "\n")
-                    entrez.append(node1)
-
-                if not node2 in entrez:
-                    entrez_2 = Entrez(str(data.iloc[i]['Entrez Gene Interactor B']))
-                    eval_ln = CEvaluationLink(CPredicateNode("has_entrez_id"), CListLink(gene_2, entrez_2))
-                    f.write(eval_ln.recursive_print() + "\n")
-                    entrez.append(node2)
-
-        number_of_genes = []
-        for p in pairs.keys():
-            gene_1 = CGeneNode(p.split(':')[0])
-            gene_2 = CGeneNode(p.split(':')[1])
+        entrez_seen = set()
+        for chunk in data:
+            convert_chunk(chunk[COLUMNS + [pubsource]], pubsource, f, genes, entrez_seen, pairs)
+
+        number_of_genes = set()
+        for (first, second), pubmed in pairs.items():
+            gene_1 = genes[first]
+            gene_2 = genes[second]
             interacts_ln = CEvaluationLink(CPredicateNode("interacts_with"), CSetLink(gene_1, gene_2))
             eval_ln = CEvaluationLink(CPredicateNode("has_pubmedID"), CListLink(
                 interacts_ln,
-                CListLink(*pairs[p])
+                CListLink(*[CConceptNode('https://www.ncbi.nlm.nih.gov/pubmed/?term=' + p) for p in pubmed])
             ))
-            f.write(eval_ln.recursive_print() + "\n")
+            write_atoms(f, eval_ln)
             if gene_level:
-                g.write(eval_ln.recursive_print() + "\n")
+                write_atoms(g, eval_ln)
 
-            number_of_genes.append(gene_1.name)
-            number_of_genes.append(gene_2.name)
+            number_of_genes.add(gene_1.name)
+            number_of_genes.add(gene_2.name)
+    if gene_level:
+        g.close()
 
-    number_of_interactions = len(set(pairs.keys()))
+    number_of_interactions = len(pairs)
     script = "https://github.com/MOZI-AI/knowledge-import/biogrid.py"
-    metadata.update_meta("Biogrid:" + version, source, script, genes=str(len(set(number_of_genes))),
+    metadata.update_meta("Biogrid:" + version, source, script, genes=str(len(number_of_genes)),
                          interactions=str(number_of_interactions))
+    if state:
+        outputs = {'gene_gene': biogrid_path}
+        if gene_level:
+            outputs['gene-level'] = gene_level_path
+        incremental.record('biogrid', state, outputs, version)
     print("Done, check " + 'dataset/biogrid_gene_gene_' + version + "_" + str(date.today()) + '.scm')
 
 
@@ -144,6 +257,12 @@ def parse_args():
                         help='download and process db from biogrid')
     parser.add_argument('--version', type=str, default='',
                         help='version to download(by default lastest is used)')
+    parser.add_argument('--chunksize', type=int, default=0,
+                        help='parse the data in chunks of this many rows to bound memory use')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip the import if the input is unchanged since the last incremental import, '
+                             'otherwise also write the added and removed atoms')
+    current_symbols.add_arguments(parser)
     return parser.parse_args()
 
 
@@ -153,16 +272,19 @@ if __name__ == "__main__":
   run the script with the path to the source data (if downloaded)
         python biogrid.py --path /path/to/the/source_data
   Or run the script and specify a version number you wanted or just hit enter (to get the latest)
+  Add --chunksize 100000 to stream the data instead of loading the whole file
+  Add --incremental to skip unchanged input and write the added/removed atoms since the last run
   """
     arguments = parse_args()
+    current_symbols.configure(arguments)
     form = arguments.format
     version = arguments.version
     if arguments.path:
         dataset_path = arguments.path
         if form:
-            import_local_data(dataset_path, form=form)
+            import_local_data(dataset_path, form=form, chunksize=arguments.chunksize, delta=arguments.incremental)
         else:
-            import_local_data(dataset_path)
+            import_local_data(dataset_path, chunksize=arguments.chunksize, delta=arguments.incremental)
     else:
         print("Imports interaction between genes (Homo_sapiens) from thebiogrid.com")
-        import_data_from_web(version, form=form)
+        import_data_from_web(version, form=form, chunksize=arguments.chunksize, delta=arguments.incremental)
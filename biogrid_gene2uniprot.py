@@ -36,7 +36,7 @@ def to_atomese(data):
                 expresion = CEvaluationLink(CPredicateNode("expresses"), CListLink(CGeneNode(gene),ProteinNode(prot)))
                 bio_prot = CEvaluationLink(CPredicateNode("has_biogridID"), CListLink(ProteinNode(prot), CConceptNode("Bio:"+biogrid_id)))
                 bio_gene = CEvaluationLink(CPredicateNode("has_biogridID"), CListLink(CGeneNode(gene), CConceptNode("Bio:"+biogrid_id)))
-                f.write("\n".join([x.recursive_print() for x in [expresion, bio_prot, bio_gene]]))
+                write_atoms(f, expresion, bio_prot, bio_gene)
                 
     metadata.update_meta("Biogrid-Gene2uniprot:latest", 
         "uniprot2biogrid.csv, gene2biogrid.csv",script,genes=str(len(genes)),prot=len(proteins))
@@ -19,7 +19,7 @@ def create_gene_expr_ln(patient, gene, value, fp, overexpr):
             exec_ln = CExecutionLink(gene_exec_ln, patient,
                                      CNumberNode(str(value)))
 
-        fp.write(exec_ln.recursive_print() + "\n")
+        write_atoms(fp, exec_ln)
 
 
 def expr_to_int(gene, val, expr_dict, overexpr):
@@ -45,11 +45,11 @@ def create_quantitative_predicate_ln(gene, overexpr, fp):
             CLazyExecutionOutputLink(CSchemaNode("make-underexpression-schema-for-gene"), CGeneNode(gene)),
             CLazyExecutionOutputLink(CSchemaNode("make-underexpression-predicate-for-gene"), CGeneNode(gene)))
 
-    fp.write(quant_ln.recursive_print() + "\n")
+    write_atoms(fp, quant_ln)
 
 def create_member_ln(gene, fp):
     member_ln = CMemberLink(CGeneNode(gene), CConceptNode("profiled-genes"))
-    fp.write(member_ln.recursive_print() + "\n")
+    write_atoms(fp, member_ln)
 
 def import_gene_expr(patient_df, overexpr_fp, underexpr_fp):
     df = patient_df.dropna(axis=1, how='all')
@@ -25,10 +25,10 @@ def create_state_ln(patient, marker, value, fp):
                 eval_ln = CEvaluationLink(CPredicateNode(marker), patient, stv=CStv(0.0, 1.0))
             else:
                 eval_ln = CEvaluationLink(CPredicateNode(marker), patient, stv=CStv(1.0, 1.0))
-            fp.write(eval_ln.recursive_print() + "\n")
+            write_atoms(fp, eval_ln)
         elif marker in non_bool_vals:
             eval_ln = CEvaluationLink(CPredicateNode(marker), CListLink(patient, CConceptNode(str(value))), stv=CStv(1.0, 1.0))
-            fp.write(eval_ln.recursive_print() + "\n")
+            write_atoms(fp, eval_ln)
 
 
 def create_mutation_ln(patient, mut, value, fp):
@@ -40,7 +40,7 @@ def create_mutation_ln(patient, mut, value, fp):
     if not pd.isna(value) and value != 0:
         gene_name = gene_dict[mut]
         eval_ln = CEvaluationLink(CPredicateNode("has_mutation"), CListLink(CGeneNode(gene_name), patient), stv=CStv(value, 1.0))
-        fp.write(eval_ln.recursive_print() + "\n")
+        write_atoms(fp, eval_ln)
 
 
 def create_outcome_ln(patient, outcome, value, fp):
@@ -55,7 +55,7 @@ def create_outcome_ln(patient, outcome, value, fp):
         else:
             eval_ln = CEvaluationLink(CPredicateNode(outcome), CListLink(patient, CConceptNode("positive")), stv=CStv(1.0, 1.0))
 
-        fp.write(eval_ln.recursive_print() + "\n")
+        write_atoms(fp, eval_ln)
 
 
 def create_treatment_ln(patient, treatment, value, drugs_df, fp):
@@ -67,7 +67,7 @@ def create_treatment_ln(patient, treatment, value, drugs_df, fp):
     if not pd.isna(value) and value != 0:
         if treatment == "surgery_type":
             surgery_type_ln = CEvaluationLink(CPredicateNode("surgery_type"), CListLink(patient, CConceptNode(value)), stv=CStv(1.0, 1.0))
-            fp.write(surgery_type_ln.recursive_print() + "\n")
+            write_atoms(fp, surgery_type_ln)
         else:
             try:
                 drug_series = drugs_df[drugs_df.Name == treatment].iloc[0]
@@ -79,7 +79,7 @@ def create_treatment_ln(patient, treatment, value, drugs_df, fp):
                         chebi_id = (chebi[0]).split(":")[-1]
                         eval_ln = CEvaluationLink(CPredicateNode("has_treatment"), CListLink(patient, ChebiNode("ChEBI:" + chebi_id)),
                                               stv=CStv(1.0, 1.0))
-                        fp.write(eval_ln.recursive_print() + "\n")
+                        write_atoms(fp, eval_ln)
                     else: #look for pubchem
                         pubchem = [x for x in cross_ref if x.startswith("PubChem")]
                         if len(pubchem) > 0:
@@ -87,7 +87,7 @@ def create_treatment_ln(patient, treatment, value, drugs_df, fp):
                             eval_ln = CEvaluationLink(CPredicateNode("has_treatment"),
                                       CListLink(patient, PubchemNode("PubChem:" + pubchem_id)),
                                       stv=CStv(1.0, 1.0))
-                            fp.write(eval_ln.recursive_print() + "\n")
+                            write_atoms(fp, eval_ln)
 
             except IndexError:
                 pass
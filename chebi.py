@@ -0,0 +1,141 @@
+# ChEBI name index shared by drugbank.py and tcmid.py
+# Names and EXACT synonyms of raw_data/chebi.obo are kept in raw_data/chebi-names.db, the index is
+# only rebuilt when the obo release changes. chebi.obo is only downloaded again when it changed upstream
+import os
+import sqlite3
+import argparse
+import requests
+from collections.abc import Mapping
+from email.utils import formatdate, parsedate_to_datetime
+import obo
+
+chebi_url = "https://ftp.ebi.ac.uk/pub/databases/chebi/ontology/chebi.obo"
+chebi_obo = "raw_data/chebi.obo"
+store_path = os.environ.get("CHEBI_NAMES_DB", "raw_data/chebi-names.db")
+
+class ChebiNames(Mapping):
+    """
+    Lower case name -> ChEBI ID ("ChEBI:<number>") stored in a sqlite file
+
+    Names are looked up in the database, nothing is loaded into memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or store_path
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY, chebi_id TEXT) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def __getitem__(self, name):
+        row = self.conn.execute("SELECT chebi_id FROM names WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute("SELECT name FROM names").fetchall())
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM names").fetchone()[0]
+
+    def rebuild(self, names, release):
+        """
+        Replace the index with the (name, ChEBI ID) pairs, later pairs win for the same name
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM names")
+            self.conn.executemany("INSERT OR REPLACE INTO names VALUES (?, ?)", names)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('release', ?)", (release,))
+
+    def release(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'release'").fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.conn.close()
+
+def download(path=chebi_obo, url=chebi_url):
+    """
+    Download chebi.obo unless the local copy is as recent as the one on the server
+
+    The file gets the Last-Modified time of the server, so it is sent back as
+    If-Modified-Since next time. A local copy is used when the server can't be reached.
+    """
+    headers = {}
+    if os.path.exists(path):
+        headers["If-Modified-Since"] = formatdate(os.path.getmtime(path), usegmt=True)
+    try:
+        response = requests.get(url, headers=headers, stream=True, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if os.path.exists(path):
+            print("Failed to check {} ({}), using {}".format(url, e, path))
+            return path
+        raise
+    if response.status_code == 304:
+        print("{} is up to date".format(path))
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".part", "wb") as f:
+        for chunk in response.iter_content(chunk_size=1 << 20):
+            f.write(chunk)
+    if "Last-Modified" in response.headers:
+        modified = parsedate_to_datetime(response.headers["Last-Modified"]).timestamp()
+        os.utime(path + ".part", (modified, modified))
+    os.replace(path + ".part", path)
+    print("File downloaded: {}".format(path))
+    return path
+
+def release(path):
+    """
+    Release stamp of an obo file: its data-version and the file time and size
+    """
+    version = obo.read_header(path).get("data-version", [""])[0]
+    return "{} {} {}".format(version, os.path.getmtime(path), os.path.getsize(path))
+
+def read_names(path):
+    """
+    Yield (lower case name, ChEBI ID) for the names and EXACT synonyms of the terms, in file order
+    """
+    for term in obo.read_obo(path):
+        chebi_name = [term.name] if term.name else []
+        for name, scope in term.synonyms:
+            if scope == "EXACT" and name not in chebi_name:
+                chebi_name.append(name)
+        for name in chebi_name:
+            yield name.lower(), term.id.replace("CHEBI:", "ChEBI:")
+
+def load_names(obo_path=None, path=None):
+    """
+    Open the ChEBI name index, indexing chebi.obo when its release changed since the last import
+
+    chebi.obo is downloaded (when changed upstream) unless obo_path is given.
+    """
+    obo_path = obo_path or download()
+    store = ChebiNames(path)
+    stamp = release(obo_path)
+    if store.release() != stamp:
+        print("Indexing ChEBI names from {}".format(obo_path))
+        store.rebuild(read_names(obo_path), stamp)
+    return store
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='download chebi.obo and index its names')
+    parser.add_argument('--obo', type=str, default='',
+                        help='path to chebi.obo (default: download {} when changed)'.format(chebi_url))
+    parser.add_argument('--db', type=str, default='',
+                        help='path to the name index (default: {})'.format(store_path))
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    """
+    usage:
+        python chebi.py
+        python chebi.py --obo raw_data/chebi.obo --db raw_data/chebi-names.db
+    """
+    arguments = parse_args()
+    store = load_names(arguments.obo or None, arguments.db or None)
+    print("{} ChEBI names in {}".format(len(store), store.path))
+    store.close()
@@ -30,6 +30,7 @@ print("\nStarted importing\n")
 rnas = []
 genes = []
 proteins = []
+atoms = AtomTable()
 with open("dataset/codingRNA_{}.scm".format(str(date.today())), 'w') as f:
     for i in range(len(df)):
         rna = df.iloc[i]["transcript_stable_id"]
@@ -40,12 +41,13 @@ with open("dataset/codingRNA_{}.scm".format(str(date.today())), 'w') as f:
         proteins.append(prot)
         if gene:
             trans = CEvaluationLink(CPredicateNode("transcribed_to"), CListLink(CGeneNode(gene),CRNANode(rna)))
-            f.write(trans.recursive_print() + "\n")
+            atoms.add(trans)
         if rna:
             trans = CEvaluationLink(CPredicateNode("translated_to"), CListLink(CRNANode(rna), ProteinNode(prot)))
-            f.write(trans.recursive_print() + "\n")
+            atoms.add(trans)
             expr = CEvaluationLink(CPredicateNode("expresses"), CListLink(CGeneNode(gene), ProteinNode(prot)))
-            f.write(expr.recursive_print() + "\n")
+            atoms.add(expr)
+    atoms.flush(f)
 
 version = dataset.split(".")[1]
 script = "https://github.com/MOZI-AI/knowledge-import/codingRNA.py"
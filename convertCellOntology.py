@@ -310,8 +310,7 @@ def main():
     else:
         output = open(args.output, 'wt')
 
-    classes_to_print =  '\n'.join([x.recursive_print() for x in classes_dict])
-    output.write(classes_to_print)
+    write_atoms(output, *classes_dict)
     output.close()
 
 if __name__ == '__main__':
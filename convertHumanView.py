@@ -676,8 +676,7 @@ def main():
     else:
         output = open(args.output, 'wt')
 
-    classes_to_print = '\n'.join([x.recursive_print() for x in db_dict])
-    output.write(classes_to_print)
+    write_atoms(output, *db_dict)
     output.close()
 
 
@@ -28,9 +28,9 @@ def define_protein_lns(gene_node, prot_node, bio_id, fp):
     prot_bio = CEvaluationLink(CPredicateNode("has_biogridID"),
                                CListLink(prot_node, CConceptNode("Bio:" + bio_id)))
 
-    fp.write(express_ln.recursive_print() + "\n")
-    fp.write(gene_bio.recursive_print() + "\n")
-    fp.write(prot_bio.recursive_print() + "\n")
+    write_atoms(fp, express_ln)
+    write_atoms(fp, gene_bio)
+    write_atoms(fp, prot_bio)
 
 
 def add_protein_interaction(proteins_lst, prot_node_1, gene_node_1, prot_node_2, gene_node_2, bio_id_1, bio_id_2, fp):
@@ -113,21 +113,21 @@ def import_data(data, source, version, gene_level=False, form='tab2'):
                     if not gene1 in entrez:
                         entrez_ln_1 = CEvaluationLink(CPredicateNode("has_entrez_id"),
                                                       CListLink(gene_node_1, Entrez(entrez1)))
-                        f.write(entrez_ln_1.recursive_print() + "\n")
+                        write_atoms(f, entrez_ln_1)
                         entrez.append(gene1)
 
                     if not gene2 in entrez:
                         eval_ln_2 = CEvaluationLink(CPredicateNode("has_entrez_id"),
                                                     CListLink(gene_node_2, Entrez(entrez2)))
-                        f.write(eval_ln_2.recursive_print() + "\n")
+                        write_atoms(f, eval_ln_2)
                         entrez.append(gene2)
 
                     interacts_ln = CEvaluationLink(CPredicateNode("interacts_with"),
                                                    CSetLink(gene_node_1, gene_node_2), stv=stv_node)
-                    f.write(interacts_ln.recursive_print() + "\n")
+                    write_atoms(f, interacts_ln)
 
                     if gene_level:
-                        g.write(interacts_ln.recursive_print() + "\n")
+                        write_atoms(g, interacts_ln)
 
                     if taxonomy_id_1 == 2697049:
                         covid_genes.append(gene1)
@@ -135,20 +135,20 @@ def import_data(data, source, version, gene_level=False, form='tab2'):
                                         CListLink(gene_node_1, NcbiTaxonomy("taxid:{}".format(str(taxonomy_id_1)))))
                         organism_ln_2 = CEvaluationLink(CPredicateNode("from_organism"),
                                         CListLink(prot_node_1, NcbiTaxonomy("taxid:{}".format(str(taxonomy_id_1)))))
-                        f.write(organism_ln_1.recursive_print() + "\n")
-                        f.write(organism_ln_2.recursive_print() + "\n")
+                        write_atoms(f, organism_ln_1)
+                        write_atoms(f, organism_ln_2)
                         if gene_level:
-                            g.write(organism_ln_1.recursive_print() + "\n")
+                            write_atoms(g, organism_ln_1)
                     if taxonomy_id_2 == 2697049:
                         covid_genes.append(gene2)
                         organism_ln_1 = CEvaluationLink(CPredicateNode("from_organism"),
                                                         CListLink(gene_node_2, NcbiTaxonomy("taxid:{}".format(str(taxonomy_id_2)))))
                         organism_ln_2 = CEvaluationLink(CPredicateNode("from_organism"),
                                                         CListLink(prot_node_2, NcbiTaxonomy("taxid:{}".format(str(taxonomy_id_2)))))
-                        f.write(organism_ln_1.recursive_print() + "\n")
-                        f.write(organism_ln_2.recursive_print() + "\n")
+                        write_atoms(f, organism_ln_1)
+                        write_atoms(f, organism_ln_2)
                         if gene_level:
-                            g.write(organism_ln_1.recursive_print() + "\n")
+                            write_atoms(g, organism_ln_1)
 
                     gene_pairs.append((gene1, gene2))
 
@@ -156,7 +156,7 @@ def import_data(data, source, version, gene_level=False, form='tab2'):
                     interacts_ln = CEvaluationLink(CPredicateNode("interacts_with"),
                                                    CSetLink(prot_node_1, prot_node_2), stv=stv_node)
 
-                    f.write(interacts_ln.recursive_print() + "\n")
+                    write_atoms(f, interacts_ln)
 
                     bio_1 = str(data.iloc[i]['BioGRID ID Interactor A']).strip()
                     bio_2 = str(data.iloc[i]['BioGRID ID Interactor B']).strip()
@@ -167,8 +167,8 @@ def import_data(data, source, version, gene_level=False, form='tab2'):
         
         org_name_ln = CEvaluationLink(CPredicateNode("has_name"),
                                       CListLink(NcbiTaxonomy("taxid:2697049"), CConceptNode("SARS-CoV-2")))
-        f.write(org_name_ln.recursive_print() + "\n")
-        g.write(org_name_ln.recursive_print() + "\n")
+        write_atoms(f, org_name_ln)
+        write_atoms(g, org_name_ln)
     gene_pairs = set((a, b) if a <= b else (b, a) for a, b in gene_pairs)
     number_of_interactions = len(gene_pairs)
     script = "https://github.com/MOZI-AI/knowledge-import/coronavirus_biogrid.py"
@@ -1,7 +1,13 @@
 import pandas as pd
 import requests
 import io
+import os
+import datetime
+import sqlite3
+import argparse
+from contextlib import closing
 import numpy as np
+from types import MappingProxyType
 
 # Splits string entry to rows and expand the dataframe
 def explode(df, lst_cols, fill_value='NA', preserve_index=False):
@@ -26,7 +32,7 @@ def explode(df, lst_cols, fill_value='NA', preserve_index=False):
     # append those rows that have empty lists
     if (lens == 0).any():
         # at least one list in cells is empty
-        res = (res.append(df.loc[lens==0, idx_cols], sort=False)
+        res = (pd.concat([res, df.loc[lens==0, idx_cols]], sort=False)
                   .fillna(fill_value))
     # revert the original index order
     res = res.sort_index()
@@ -39,34 +45,258 @@ def explode(df, lst_cols, fill_value='NA', preserve_index=False):
 url = "https://www.genenames.org/cgi-bin/download/custom?col=gd_app_sym&"+ \
     "col=gd_prev_sym&status=Approved&status=Entry%20Withdrawn&hgnc_dbtag=on&" + \
     "order_by=gd_app_sym_sort&format=text&submit=submit"
+WITHDRAWN_SUFFIX = "~WITHDRAWN"
+
+# On-disk cache of HGNC snapshots, keyed by download date
+cache_path = os.environ.get("HGNC_SYMBOLS_CACHE", "raw_data/hgnc_symbols.db")
+# snapshots older than cache_ttl days are refreshed when the network is available
+cache_ttl = 30
+# download date of a pinned snapshot, no refresh is attempted when set
+pinned_snapshot = None
+# key of the snapshot the symbol map was built from
+loaded_snapshot = None
+seed_file = "raw_data/custom_current.txt"
+
 current_symbols_df = []
 previous_symbols = []
+# previous symbol -> approved symbol, read-only once built
+symbol_map = MappingProxyType({})
+withdrawn_symbols = frozenset()
 
-def build_df():
-    global current_symbols_df
-    global previous_symbols
+def normalize_table(df):
+    """
+    Explode and uppercase a HGNC table with "Approved symbol" and "Previous symbols" columns
 
-    data = requests.get(url).content
-    current_symbols_df = pd.read_csv(io.StringIO(data.decode('utf-8')), sep="\t")
-    current_symbols_df = current_symbols_df.fillna("NA")
+    The seed file marks withdrawn entries in "Approved name" instead of
+    using the "~withdrawn" suffix of the download, both end up as the suffix.
+    """
+    df = df.fillna("NA")
+    if "Approved name" in df.columns:
+        withdrawn = df["Approved name"].str.startswith("symbol withdrawn")
+        df.loc[withdrawn, "Approved symbol"] = df.loc[withdrawn, "Approved symbol"] + WITHDRAWN_SUFFIX
+    df = df[["Approved symbol", "Previous symbols"]].copy()
 
     # Split string entry(morethan one previous Gene symbols listed as a string) to separate rows
-    current_symbols_df["Previous symbols"] = current_symbols_df["Previous symbols"].str.split(",")
-    current_symbols_df = explode(current_symbols_df, ["Previous symbols"])
+    df["Previous symbols"] = df["Previous symbols"].str.split(",")
+    df = df.explode("Previous symbols", ignore_index=True)
 
     # Convert Gene symbols to uppercase and remove space
-    current_symbols_df["Previous symbols"] = current_symbols_df["Previous symbols"].str.upper().str.strip()
-    current_symbols_df["Approved symbol"] = current_symbols_df["Approved symbol"].str.upper()
+    df["Previous symbols"] = df["Previous symbols"].str.upper().str.strip()
+    df["Approved symbol"] = df["Approved symbol"].str.upper()
+    return df
+
+def open_cache(path=None):
+    conn = sqlite3.connect(path or cache_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS snapshots (date TEXT PRIMARY KEY, source TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS symbols (date TEXT, previous TEXT, approved TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS symbols_date ON symbols (date)")
+    return conn
+
+def save_snapshot(df, date, source, path=None):
+    """
+    Store a normalized HGNC table in the cache under the given download date
+
+    Only the rows needed to build the map are kept: previous symbols and
+    withdrawn entries.
+    """
+    keep = (df["Previous symbols"] != "NA") | df["Approved symbol"].str.endswith(WITHDRAWN_SUFFIX)
+    rows = zip(df.loc[keep, "Previous symbols"].values, df.loc[keep, "Approved symbol"].values)
+    with closing(open_cache(path)) as conn, conn:
+        conn.execute("DELETE FROM symbols WHERE date = ?", (date,))
+        conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?)", (date, source))
+        conn.executemany("INSERT INTO symbols VALUES (?, ?, ?)",
+                         ((date, previous, approved) for previous, approved in rows))
+
+def load_snapshot(date, path=None):
+    with closing(open_cache(path)) as conn:
+        rows = conn.execute("SELECT previous, approved FROM symbols WHERE date = ? ORDER BY rowid",
+                            (date,)).fetchall()
+    return pd.DataFrame(rows, columns=["Previous symbols", "Approved symbol"])
+
+def list_snapshots(path=None):
+    with closing(open_cache(path)) as conn:
+        return conn.execute("SELECT date, source FROM snapshots ORDER BY date").fetchall()
+
+def latest_snapshot(path=None):
+    snapshots = [date for date, _ in list_snapshots(path)]
+    # free-form keys (e.g. "seed") would sort after iso dates, prefer dated snapshots
+    dated = [date for date in snapshots if is_date(date)]
+    if dated:
+        return dated[-1]
+    return snapshots[-1] if snapshots else None
+
+def is_date(date):
+    try:
+        datetime.date.fromisoformat(date)
+    except ValueError:
+        return False
+    return True
+
+def is_fresh(date):
+    try:
+        age = datetime.date.today() - datetime.date.fromisoformat(date)
+    except ValueError:
+        # seed snapshots may use a free-form key
+        return False
+    return age.days <= cache_ttl
+
+def download_table():
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return pd.read_csv(io.StringIO(response.content.decode('utf-8')), sep="\t")
+
+def load_seed(path=None, date="seed"):
+    """
+    Load a HGNC custom download (e.g. raw_data/custom_current.txt) into the cache
+    """
+    df = normalize_table(pd.read_csv(path or seed_file, sep="\t", dtype=str))
+    save_snapshot(df, date, os.path.abspath(path or seed_file))
+    return df
+
+def build_df():
+    global current_symbols_df
+    global previous_symbols
+    global loaded_snapshot
+
+    if pinned_snapshot:
+        if pinned_snapshot not in [s[0] for s in list_snapshots()]:
+            raise RuntimeError("HGNC snapshot {0} is not in {1}".format(pinned_snapshot, cache_path))
+        current_symbols_df = load_snapshot(pinned_snapshot)
+        loaded_snapshot = pinned_snapshot
+    else:
+        date = latest_snapshot()
+        if date is not None and is_fresh(date):
+            current_symbols_df = load_snapshot(date)
+            loaded_snapshot = date
+        else:
+            try:
+                current_symbols_df = normalize_table(download_table())
+                loaded_snapshot = str(datetime.date.today())
+                save_snapshot(current_symbols_df, loaded_snapshot, url)
+            except requests.RequestException as e:
+                print("Failed to download HGNC symbols ({0}), using cached snapshot".format(e))
+                if date is not None:
+                    current_symbols_df = load_snapshot(date)
+                    loaded_snapshot = date
+                else:
+                    current_symbols_df = load_seed()
+                    loaded_snapshot = "seed"
 
     previous_symbols = current_symbols_df["Previous symbols"].unique()
+    build_map(current_symbols_df)
 
-def get_current_symbol(gene):
-    if len(current_symbols_df) == 0:
+def build_map(df):
+    """
+    Build the previous -> approved symbol dictionary from the exploded HGNC table
+
+    Withdrawn entries ("SYMBOL~withdrawn") have no approved replacement, they
+    are collected in withdrawn_symbols and never used as a mapping target.
+    When a previous symbol belongs to several genes the first approved symbol
+    in HGNC order wins, as the DataFrame filter used to do.
+    """
+    global symbol_map
+    global withdrawn_symbols
+
+    mapping = {}
+    withdrawn = set()
+    for previous, approved in zip(df["Previous symbols"].values, df["Approved symbol"].values):
+        if approved.endswith(WITHDRAWN_SUFFIX):
+            withdrawn.add(approved[:-len(WITHDRAWN_SUFFIX)])
+            continue
+        if previous != "NA" and previous not in mapping:
+            mapping[previous] = approved
+    symbol_map = MappingProxyType(mapping)
+    withdrawn_symbols = frozenset(withdrawn)
+
+def ensure_map():
+    if len(symbol_map) == 0:
         build_df()
+
+def snapshot_id():
+    """
+    Key of the HGNC snapshot used to resolve symbols, the map is built first if needed
+    """
+    ensure_map()
+    return loaded_snapshot
+
+def get_current_symbol(gene):
+    ensure_map()
     gene = str(gene).upper()
-    if gene in previous_symbols:
-        result = current_symbols_df[current_symbols_df["Previous symbols"] == gene]["Approved symbol"].values
-        if len(result) > 0:
-            gene = result[0]
-    return gene
-    
\ No newline at end of file
+    return symbol_map.get(gene, gene)
+
+def resolve_many(symbols):
+    """
+    Resolve an iterable of gene symbols to their current HGNC symbols
+
+    Returns a list in the same order as the input
+    """
+    ensure_map()
+    lookup = symbol_map.get
+    result = []
+    for gene in symbols:
+        gene = str(gene).upper()
+        result.append(lookup(gene, gene))
+    return result
+
+def resolve_series(symbols):
+    """
+    Vectorized version of get_current_symbol for a pandas Series
+    """
+    ensure_map()
+    symbols = symbols.astype(str).str.upper()
+    return symbols.map(symbol_map).fillna(symbols)
+
+def is_withdrawn(gene):
+    ensure_map()
+    return str(gene).upper() in withdrawn_symbols
+
+def add_arguments(parser):
+    """
+    Add the HGNC symbol cache options to an importer's argument parser
+    """
+    parser.add_argument('--symbols-cache', type=str, default=cache_path,
+                        help='sqlite file with cached HGNC symbol snapshots')
+    parser.add_argument('--symbols-ttl', type=int, default=cache_ttl,
+                        help='refresh the HGNC snapshot when older than this many days')
+    parser.add_argument('--symbols-snapshot', type=str, default=None,
+                        help='use the cached HGNC snapshot with this download date, never download')
+    return parser
+
+def configure(args):
+    global cache_path
+    global cache_ttl
+    global pinned_snapshot
+    cache_path = args.symbols_cache
+    cache_ttl = args.symbols_ttl
+    pinned_snapshot = args.symbols_snapshot
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='manage the cached HGNC symbol snapshots')
+    parser.add_argument('--seed', type=str, default='',
+                        help='load a HGNC custom download (e.g. {0}) as a snapshot'.format(seed_file))
+    parser.add_argument('--date', type=str, default=str(datetime.date.today()),
+                        help='download date to store the seed snapshot under')
+    parser.add_argument('--refresh', action='store_true',
+                        help='download the current HGNC table into the cache')
+    parser.add_argument('--ensure', action='store_true',
+                        help='download the HGNC table only if the cached snapshot is stale')
+    add_arguments(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    """
+    usage:
+        python current_symbols.py --seed raw_data/custom_current.txt --date 2020-03-01
+        python current_symbols.py --refresh
+        python current_symbols.py --ensure
+    """
+    arguments = parse_args()
+    configure(arguments)
+    if arguments.seed:
+        load_seed(arguments.seed, arguments.date)
+    if arguments.refresh:
+        save_snapshot(normalize_table(download_table()), str(datetime.date.today()), url)
+    if arguments.ensure:
+        ensure_map()
+    for date, source in list_snapshots():
+        print("{0}\t{1}".format(date, source))
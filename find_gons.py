@@ -1,34 +1,236 @@
 # Finds GO node type from their namespace
+# The namespaces come from a local go.obo (including alt_ids and obsolete terms) and are kept
+# in raw_data/go-namespace.db, QuickGO is only asked, in batches, for terms the obo doesn't know
+import os
+import asyncio
+import sqlite3
 import requests
+import wget
+from collections.abc import MutableMapping
 from atomwrappers import *
 import json
+import obo
+
+obo_source = "http://snapshot.geneontology.org/ontology/go.obo"
+obo_file = "raw_data/go.obo"
+# GO id -> namespace store shared by the importers, seeded from the json file
+store_path = os.environ.get("GO_NAMESPACE_DB", "raw_data/go-namespace.db")
+namespace_file = "raw_data/go-namespace.json"
+# QuickGO REST api, the multi-id terms endpoint is used for batches of batch_size ids
+base_url = os.environ.get("QUICKGO_URL", "https://www.ebi.ac.uk/QuickGO/services")
+batch_size = 100
+# batches requested at the same time, retries per batch and the first retry delay in seconds
+concurrency = 4
+retries = 3
+backoff = 1.0
+
+# loaded on first use by find_go_type
+go_namespace = None
+# terms QuickGO was already asked for without an answer
+unresolved = set()
+
+class NamespaceStore(MutableMapping):
+    """
+    GO id -> namespace mapping stored in a sqlite file
+
+    Lookups are cached in memory, new terms are written with INSERT OR IGNORE
+    so several importers can add to the same store. The database is in WAL
+    mode, readers are not blocked by a writing process.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or store_path
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS namespaces (go_id TEXT PRIMARY KEY, namespace TEXT) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.cache = {}
+
+    def __getitem__(self, go_id):
+        if go_id in self.cache:
+            return self.cache[go_id]
+        row = self.conn.execute("SELECT namespace FROM namespaces WHERE go_id = ?", (go_id,)).fetchone()
+        if row is None:
+            raise KeyError(go_id)
+        self.cache[go_id] = row[0]
+        return row[0]
+
+    def __contains__(self, go_id):
+        try:
+            self[go_id]
+        except KeyError:
+            return False
+        return True
+
+    def __setitem__(self, go_id, namespace):
+        self.update({go_id: namespace})
+
+    def __delitem__(self, go_id):
+        with self.conn:
+            deleted = self.conn.execute("DELETE FROM namespaces WHERE go_id = ?", (go_id,)).rowcount
+        self.cache.pop(go_id, None)
+        if not deleted:
+            raise KeyError(go_id)
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute("SELECT go_id FROM namespaces").fetchall())
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM namespaces").fetchone()[0]
+
+    def update(self, other=(), replace=False):
+        """
+        Add the terms of a mapping in one transaction
+
+        Terms already in the store keep their namespace unless replace is set.
+        """
+        rows = list(dict(other).items())
+        verb = "REPLACE" if replace else "IGNORE"
+        with self.conn:
+            self.conn.executemany("INSERT OR {} INTO namespaces VALUES (?, ?)".format(verb), rows)
+        if replace:
+            self.cache.update(rows)
+        else:
+            # another process may have stored a different namespace first
+            for go_id, _ in rows:
+                self.cache.pop(go_id, None)
+
+    def preload(self):
+        """
+        Read the whole store into the cache, for imports that look up most GO terms
+        """
+        self.cache.update(self.conn.execute("SELECT go_id, namespace FROM namespaces").fetchall())
+        return self
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def close(self):
+        self.conn.close()
+
+def index_obo(path=obo_file):
+    """
+    Map every GO id of the [Term] stanzas in an obo file to its namespace
+
+    alt_ids get the namespace of their term, obsolete terms are kept.
+    """
+    index = {}
+    for term in obo.read_obo(path):
+        if term.namespace:
+            index.update(dict.fromkeys([term.id] + term.alt_id, term.namespace))
+    return index
+
+def load_namespace(path=None, obo_path=obo_file, seed=namespace_file):
+    """
+    Open the GO namespace store, indexing go.obo when it changed since the last import
+
+    An empty store is first seeded from the json file, go.obo is downloaded when missing.
+    """
+    store = NamespaceStore(path)
+    if store.get_meta("seed") is None and os.path.isfile(seed):
+        with open(seed, "r") as ns:
+            store.update(json.load(ns))
+        store.set_meta("seed", seed)
+    if not os.path.exists(obo_path):
+        wget.download(obo_source, os.path.dirname(obo_path) or ".")
+    stamp = "{} {}".format(os.path.getmtime(obo_path), os.path.getsize(obo_path))
+    if store.get_meta(obo_path) != stamp:
+        print("Indexing GO namespaces from {}".format(obo_path))
+        store.update(index_obo(obo_path), replace=True)
+        store.set_meta(obo_path, stamp)
+    return store
 
 def find_type(go_term, go_ns_dict, go_ns=False):
     if not go_ns:
-        if go_term in go_ns_dict.keys():
-            go_ns = go_ns_dict[go_term]
-        else:
-            go_ns = request_api(go_term)
-            go_ns_dict[go_term] = go_ns
+        go_ns = go_ns_dict.get(go_term, False)
     else:
         if not go_term in go_ns_dict.keys():
             go_ns_dict[go_term] = go_ns
 
     result = match_type(go_ns, go_term)
-    
+
     return go_ns_dict, result
 
-def request_api(go_term):
-    requestURL = "https://www.ebi.ac.uk/QuickGO/services/ontology/go/terms/{}".format(go_term)
-    result = requests.get(requestURL, headers={ "Accept" : "application/json"}, timeout=10)
+def prefetch(go_terms, go_ns_dict):
+    """
+    Ask QuickGO for the namespace of the terms missing from go_ns_dict
+
+    All missing terms are resolved in one round of concurrent batched requests
+    and written to go_ns_dict (the namespace store) in one update. Failed
+    batches are reported and leave their terms unknown. Returns the number of
+    resolved terms.
+    """
+    missing = sorted(set(t for t in go_terms if t and t not in go_ns_dict and t not in unresolved))
+    if not missing:
+        return 0
+    print("Requesting {} GO terms missing from {}".format(len(missing), obo_file))
+    found = asyncio.run(resolve_terms(missing))
+    go_ns_dict.update(found)
+    unresolved.update(set(missing) - set(found))
+    return len(found)
+
+async def resolve_terms(go_terms):
+    """
+    Resolve GO ids in batches of batch_size, at most `concurrency` requests at a time
+
+    Returns GO id -> namespace for the terms QuickGO knows
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [go_terms[i:i + batch_size] for i in range(0, len(go_terms), batch_size)]
+    results = await asyncio.gather(*[fetch_batch(batch, semaphore) for batch in batches],
+                                   return_exceptions=True)
+    found = {}
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            print("Failed to resolve {} GO terms: {}".format(len(batch), result))
+        else:
+            found.update(result)
+    return found
+
+async def fetch_batch(go_terms, semaphore):
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.to_thread(request_batch, go_terms)
+            except (requests.RequestException, RuntimeError):
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+def request_batch(go_terms):
+    """
+    Return the namespaces QuickGO knows for a list of GO ids
+
+    A batch rejected as invalid (400) is retried term by term.
+    """
+    requestURL = "{}/ontology/go/terms/{}".format(base_url, ",".join(go_terms))
+    result = requests.get(requestURL, headers={ "Accept" : "application/json"}, timeout=30)
     if result.ok:
-        result = json.loads(result.text)
-        namespace = result['results'][0]['aspect']
-        return namespace
+        found = {}
+        for term in json.loads(result.text)['results']:
+            for go_id in [term['id']] + term.get('secondaryIds', []):
+                if go_id in go_terms:
+                    found[go_id] = term['aspect']
+        return found
     elif result.status_code == 400:
-        return False
+        if len(go_terms) == 1:
+            return {}
+        found = {}
+        for go_term in go_terms:
+            found.update(request_batch([go_term]))
+        return found
     else:
-        raise "Failure to get result from {}".format(requestURL)
+        raise RuntimeError("Failure to get result from {} ({})".format(requestURL, result.status_code))
+
+def request_api(go_term):
+    return request_batch([go_term]).get(go_term, False)
 
 def match_type(go_ns, go_term):
     if go_ns in ["BP","biological_process"]:
@@ -42,5 +244,9 @@ def match_type(go_ns, go_term):
     return result
 
 def find_go_type(go_term):
-    go_type = match_type(request_api(go_term), go_term)
-    return go_type
\ No newline at end of file
+    global go_namespace
+    if go_namespace is None:
+        go_namespace = load_namespace()
+    prefetch([go_term], go_namespace)
+    go_type = match_type(go_namespace.get(go_term, False), go_term)
+    return go_type
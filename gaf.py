@@ -0,0 +1,51 @@
+# Streaming reader for GO Annotation Files (GAF 2.x)
+# http://geneontology.org/docs/go-annotation-file-gaf-format-2.2/
+
+import gzip
+from collections import namedtuple
+
+COLUMNS = ["db", "db_object_id", "db_object_symbol", "qualifier", "go_id", "db_reference",
+           "evidence_code", "with_from", "aspect", "db_object_name", "db_object_synonym",
+           "db_object_type", "taxon", "date", "assigned_by", "annotation_extension",
+           "gene_product_form_id"]
+
+def open_gaf(path):
+    """
+    Open a GAF file as text, gzip compressed files are detected from their magic bytes
+    """
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def read_header(path):
+    """
+    Return the leading "!" comment lines of a GAF file, without the "!"
+    """
+    header = []
+    with open_gaf(path) as f:
+        for line in f:
+            if not line.startswith("!"):
+                break
+            header.append(line[1:].rstrip("\n"))
+    return header
+
+def read_gaf(path, columns=COLUMNS):
+    """
+    Yield the annotations of a GAF file one at a time
+
+    Each record is a namedtuple with only the requested columns (GAF 2.x names,
+    see COLUMNS). Missing trailing columns are empty strings.
+    """
+    Record = namedtuple("GafRecord", columns)
+    indexes = [COLUMNS.index(c) for c in columns]
+    width = max(indexes) + 1
+    with open_gaf(path) as f:
+        for line in f:
+            if line.startswith("!") or not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < width:
+                fields += [""] * (width - len(fields))
+            yield Record._make([fields[i] for i in indexes])
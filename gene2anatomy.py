@@ -2,6 +2,7 @@ import argparse
 import wget
 import pandas as pd
 import datetime
+import current_symbols
 from atomwrappers import *
 
 # source: ftp://ftp.bgee.org/current/download/calls/expr_calls/Homo_sapiens_expr_simple_development.tsv.gz
@@ -12,6 +13,7 @@ def parse_args():
                         help='the source data file')
     parser.add_argument('--output_file', type=str, default='',
                         help='output file')
+    current_symbols.add_arguments(parser)
     return parser.parse_args()
 
 def gene2anatomy(dbsource, output_file):
@@ -32,13 +34,14 @@ def gene2anatomy(dbsource, output_file):
         gene = df.iloc[i]["Gene name"]
         anatomy = df.iloc[i]["Anatomical entity ID"]
         name = df.iloc[i]["Anatomical entity name"]
-        output_file.write(CMemberLink(CGeneNode(gene), CelltypeNode(anatomy)).recursive_print() + "\n")
+        write_atoms(output_file, CMemberLink(CGeneNode(gene), CelltypeNode(anatomy)))
         if not anatomy in cell_types:
             cell_types.append(anatomy)
-            output_file.write(CEvaluationLink(CPredicateNode("has_name"), CListLink(CelltypeNode(anatomy), CConceptNode(name))).recursive_print() + "\n")
+            write_atoms(output_file, CEvaluationLink(CPredicateNode("has_name"), CListLink(CelltypeNode(anatomy), CConceptNode(name))))
 
 def main():
     args = parse_args()
+    current_symbols.configure(args)
     if(not(args.dbsource)):
         dbsource = wget.download("ftp://ftp.bgee.org/current/download/calls/expr_calls/Homo_sapiens_expr_simple_development.tsv.gz", "raw_data/")
     else:
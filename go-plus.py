@@ -8,7 +8,6 @@ import metadata
 import os
 import pandas as pd
 from datetime import date
-import json
 from atomwrappers import *
 import find_gons 
 
@@ -18,11 +17,9 @@ source_csv_latest = "http://data.bioontology.org/ontologies/GO-PLUS/download?api
 
 if not os.path.exists("raw_data/GO-PLUS.csv.gz"):
     dataset = wget.download(source_csv_latest, "raw_data")
-df = pd.read_csv("raw_data/GO-PLUS.csv.gz", dtype=str)
+df = pd.read_csv("raw_data/GO-PLUS.csv.gz", dtype=str).reset_index(drop=True)
 
-with open("raw_data/go-namespace.json", "r") as ns:
-    go_namespace = json.load(ns)
-init_namespace = len(go_namespace)
+go_namespace = find_gons.load_namespace().preload()
 
 def get_term(class_id):
     if str(class_id) == "nan":
@@ -34,7 +31,7 @@ def get_term(class_id):
             term = term.replace("CHEBI", "ChEBI")
     return term
 
-def get_type(term, parent=[]):
+def get_type(term, parent=frozenset()):
     if "UBERON" in term:
         term = UberonNode(term)
     elif "CL" in term:
@@ -56,124 +53,149 @@ def find_namespace(go_term):
     go_namespace, go_term = find_gons.find_type(go_term, go_namespace)
     return go_term
 
+# cells repeat a lot, convert every distinct value once
+term_cache = {}
+node_cache = {}
+
+def cached_term(class_id):
+    if class_id not in term_cache:
+        term_cache[class_id] = get_term(class_id)
+    return term_cache[class_id]
+
+def cached_type(term, parent=frozenset()):
+    key = (term, bool(parent))
+    if key not in node_cache:
+        node_cache[key] = get_type(term, parent) if term else False
+    return node_cache[key]
+
+def relations(rows, columns):
+    """
+    Long frame (row, column, term) of the non empty cells of the given rows and columns
+
+    "|" separated cells give one entry per value, entries are in row then column order.
+    The frame is empty when no column or cell is selected (e.g. a column missing from a release).
+    """
+    empty = pd.DataFrame({"row": [], "column": [], "term": []})
+    if len(columns) == 0:
+        return empty
+    cells = df.loc[rows, columns].stack().dropna()
+    if cells.empty:
+        return empty
+    cells = cells.str.split("|").explode()
+    return pd.DataFrame({"row": cells.index.get_level_values(0),
+                         "column": cells.index.get_level_values(1),
+                         "term": [cached_term(c) for c in cells.values]})
+
+def group_links(rel, subjects, make_link):
+    """
+    Build the links of a relations frame, grouped into row -> [links]
+
+    Cells whose term has no node type (e.g. unknown GO terms) are skipped.
+    """
+    links = {}
+    for row, column, node in zip(rel["row"].values, rel["column"].values, rel["node"].values):
+        if node:
+            links.setdefault(row, []).append(make_link(column, subjects[row], node))
+    return links
+
 # Parent CHEBI's should be a ConceptNode, not a MoleculeNode
-parents = df["Parents"]
-parent_chebis = []
-for i in [i.split("|") for i in parents if str(i) != "nan"]:
-    for c in i:
-        term = get_term(c)
-        if "ChEBI" in term:
-            parent_chebis.append(term)
+parent_terms = df["Parents"].dropna().str.split("|").explode()
+parent_chebis = set(t for t in pd.unique(parent_terms.map(cached_term)) if "ChEBI" in t)
 all_col = df.columns            
 go_columns = ["negatively regulated by","negatively regulates", "positively regulated by", "positively regulates", "regulated by", "regulates", "has part", "part of"]
+go_columns = [c for c in go_columns if c in all_col]
 uberon_columns = open("raw_data/uberon_columns.txt", "r").read().splitlines()
 uberon_columns = [c for c in uberon_columns if c in all_col]
-cl_columns = ['has part', 'Parents', 'has role']
-
-if not os.path.exists("dataset/go-plus"):
-    os.mkdir("dataset/go-plus/")
+cl_columns = [c for c in ['has part', 'Parents', 'has role'] if c in all_col]
+
+"""
+    positive/negatively regulated by is inverse of positive/negatively regulates
+    has part is inverse of part of, keep the predicate the same with reverse order
+"""
+go_predicates = {}
+for col in go_columns:
+    if col.endswith("regulated by"):
+        go_predicates[col] = CPredicateNode("GO_{}".format(col.replace("regulated by", "regulates").replace(" ", "_")))
+    elif col == "part of":
+        go_predicates[col] = CPredicateNode("GO_has_part")
+    else:
+        go_predicates[col] = CPredicateNode("GO_{}".format(col.replace(" ", "_")))
+uberon_predicates = {col: CPredicateNode("UBERON_{}".format(col.replace(" ", "_"))) for col in uberon_columns}
+cl_predicates = {col: CPredicateNode(col.replace(" ", "_")) for col in cl_columns}
 
-go = open("dataset/go-plus/Go-Plus-GO_{}.scm".format(str(date.today())),"w")
-uberon = open("dataset/go-plus/Go-Plus-UBERON_{}.scm".format(str(date.today())),"w")
-cl = open("dataset/go-plus/Go-Plus-CL_{}.scm".format(str(date.today())),"w")
-chebi = open("dataset/go-plus/Go-Plus-CHEBI_{}.scm".format(str(date.today())),"w")
+# ask QuickGO once for the terms that are not in go.obo
+go_terms = [cached_term(c) for col in ["Class ID"] + go_columns for c in df[col].dropna().str.split("|").explode()]
+find_gons.prefetch([t for t in go_terms if "GO:" in t], go_namespace)
 
-go_with_def = open("dataset/go-plus/Go-Plus-GO_with_definition_{}.scm".format(str(date.today())),"w")
-uberon_with_def = open("dataset/go-plus/Go-Plus-UBERON_with_definition_{}.scm".format(str(date.today())),"w")
-cl_with_def = open("dataset/go-plus/Go-Plus-CL_with_definition_{}.scm".format(str(date.today())),"w")
-chebi_with_def = open("dataset/go-plus/Go-Plus-CHEBI_with_definition_{}.scm".format(str(date.today())),"w")
+print("Started importing")
+terms = [cached_term(c) for c in df["Class ID"].values]
+current = (df["Obsolete"] != "true").values
+names = [CConceptNode(get_term(label)) if str(label) != "nan" else None for label in df["Preferred Label"].values]
+definitions = [CConceptNode(str(d)) for d in df["definition"].values]
+
+go_rows = [i for i, t in enumerate(terms) if t and current[i] and "GO:" in t]
+uberon_rows = [i for i, t in enumerate(terms) if t and current[i] and "GO:" not in t and "UBERON" in t]
+cl_chebi_rows = [i for i, t in enumerate(terms) if t and current[i] and "GO:" not in t and "UBERON" not in t
+                 and ("CL" in t or "ChEBI" in t)]
+
+go_nodes = {i: find_namespace(terms[i]) for i in go_rows}
+go_rows = [i for i in go_rows if go_nodes[i]]
+uberon_nodes = {i: UberonNode(terms[i]) for i in uberon_rows}
+cl_chebi_nodes = {i: cached_type(terms[i], parent_chebis) for i in cl_chebi_rows}
+
+rel = relations(go_rows, go_columns)
+rel["node"] = [find_namespace(t) if t else False for t in rel["term"].values]
+go_links = group_links(rel, go_nodes, lambda col, term, term2: CEvaluationLink(go_predicates[col], CListLink(term, term2)))
+
+rel = relations(uberon_rows, uberon_columns)
+rel["node"] = [cached_type(t) for t in rel["term"].values]
+uberon_links = group_links(rel, uberon_nodes, lambda col, term, term2: CEvaluationLink(uberon_predicates[col], CListLink(term, term2)))
+
+def cl_link(col, term, term2):
+    if col == "Parents":
+        return CInheritanceLink(term, term2)
+    return CEvaluationLink(cl_predicates[col], CListLink(term, term2))
+
+rel = relations(cl_chebi_rows, cl_columns)
+rel["node"] = [cached_type(t, parent_chebis) for t in rel["term"].values]
+cl_chebi_links = group_links(rel, cl_chebi_nodes, cl_link)
 
-meta = {}
+if not os.path.exists("dataset/go-plus"):
+    os.mkdir("dataset/go-plus/")
 
-print("Started importing")
-for i in range(len(df)):
-    try:
-        term = get_term(df.iloc[i]["Class ID"])
-        obsolete = df.iloc[i]["Obsolete"]
-        definition = CConceptNode(str(df.iloc[i]["definition"]))
-        if term and obsolete != "true" and "GO:" in term:
-            term = find_namespace(term) 
-            if term:
-                name = CConceptNode(get_term(df.iloc[i]["Preferred Label"]))
-                eva_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(term,name))
-                eva_defn = CEvaluationLink(CPredicateNode("has_definition"), CListLink(term,definition))
-                go.write(eva_name.recursive_print() + "\n")
-                go_with_def.write(eva_defn.recursive_print() + "\n" + eva_name.recursive_print() + "\n")
-                for col in go_columns:
-                    """
-                    positive/negatively regulated by is inverse of positive/negatively regulates
-                    has part is inverse of part of, keep the predicate the same with reverse order
-                    """
-                    if col.endswith("regulated by"):
-                        term2 = find_namespace(get_term(df.iloc[i][col]))
-                        if term2:
-                            col_pred = col.replace("regulated by", "regulates")
-                            col_pred = "GO_{}".format(col_pred.replace(" ", "_"))
-                            eva = CEvaluationLink(CPredicateNode(col_pred), CListLink(term, term2))
-                            go.write(eva.recursive_print() + "\n")
-                            go_with_def.write(eva.recursive_print() + "\n")
-                    elif col == "part of":
-                        term2 = find_namespace(get_term(df.iloc[i][col]))
-                        if term2:
-                            col_pred = "GO_has_part"
-                            eva = CEvaluationLink(CPredicateNode(col_pred), CListLink(term, term2)) 
-                            go.write(eva.recursive_print() + "\n")
-                            go_with_def.write(eva.recursive_print() + "\n")
-                    else:
-                        term2 = find_namespace(get_term(df.iloc[i][col]))
-                        if term2:
-                            col_pred = "GO_{}".format(col.replace(" ", "_"))
-                            eva = CEvaluationLink(CPredicateNode(col_pred), CListLink(term, term2))                 
-                            go.write(eva.recursive_print() + "\n")
-                            go_with_def.write(eva.recursive_print() + "\n")
-
-        elif term and obsolete != "true" and "UBERON" in term:
-            term = UberonNode(term)
-            name = get_term(df.iloc[i]["Preferred Label"])
-            eva_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(term, CConceptNode(name)))
-            eva_defn = CEvaluationLink(CPredicateNode("has_definition"), CListLink(term, definition))
-            uberon.write(eva_name.recursive_print() + "\n")
-            uberon_with_def.write(eva_name.recursive_print() + "\n"+ eva_defn.recursive_print() + "\n")
-            for col in uberon_columns:
-                term_2 = get_term(df.iloc[i][col])
-                if term_2:
-                    term_2 = get_type(term_2)
-                    col_pred = "UBERON_{}".format(col.replace(" ", "_"))
-                    eva = CEvaluationLink(CPredicateNode(col_pred), CListLink(term, term_2))
-                    uberon.write(eva.recursive_print() + "\n")
-
-        elif term and obsolete != "true" and "CL" in term or "ChEBI" in term:
-            if "CL" in term:
-                file_name = cl
-                file_name_with_def = cl_with_def
-            else:
-                file_name = chebi
-                file_name_with_def = chebi_with_def
-
-            term = get_type(term, parent=parent_chebis)
-            name = get_term(df.iloc[i]["Preferred Label"])
-            eva_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(term, CConceptNode(name)))
-            eva_defn = CEvaluationLink(CPredicateNode("has_definition"), CListLink(term, definition))
-            file_name.write(eva_name.recursive_print() + "\n")
-            file_name_with_def.write(eva_name.recursive_print() + "\n" + eva_defn.recursive_print() + "\n")
-            for col in cl_columns:
-                if col == "Parents":
-                    parents = df.iloc[i][col]
-                    if str(parents) != "nan":
-                        for p in parents.split("|"):
-                            term2 = get_type(get_term(p), parent=parent_chebis)
-                            inherit = CInheritanceLink(term, term2) 
-                            file_name.write(inherit.recursive_print() + "\n")
-                            file_name_with_def.write(inherit.recursive_print() + "\n")
-                else:
-                    term2 = get_term(df.iloc[i][col])
-                    if term2: 
-                        term2 = get_type(term2, parent=parent_chebis)
-                        eva_link = CEvaluationLink(CPredicateNode(col.replace(" ", "_")), CListLink(term, term2))
-                        file_name.write(eva_link.recursive_print() + "\n")
-                        file_name_with_def.write(eva_link.recursive_print() + "\n")
-    except Exception as e:
-        print("Exception {} at row {} ".format(e, i))
-        continue
+def output(name):
+    return open("dataset/go-plus/Go-Plus-{}_{}.scm".format(name, str(date.today())),"w")
+
+def describe(node, i):
+    """
+    has_name and has_definition links of row i, unlabeled terms have no has_name
+    """
+    eva_name = [CEvaluationLink(CPredicateNode("has_name"), CListLink(node, names[i]))] if names[i] else []
+    eva_defn = [CEvaluationLink(CPredicateNode("has_definition"), CListLink(node, definitions[i]))]
+    return eva_name, eva_defn
+
+with output("GO") as go, output("GO_with_definition") as go_with_def:
+    for i in go_rows:
+        eva_name, eva_defn = describe(go_nodes[i], i)
+        links = go_links.get(i, [])
+        write_atoms(go, *eva_name, *links)
+        write_atoms(go_with_def, *eva_defn, *eva_name, *links)
+
+with output("UBERON") as uberon, output("UBERON_with_definition") as uberon_with_def:
+    for i in uberon_rows:
+        eva_name, eva_defn = describe(uberon_nodes[i], i)
+        write_atoms(uberon, *eva_name, *uberon_links.get(i, []))
+        write_atoms(uberon_with_def, *eva_name, *eva_defn)
+
+with output("CL") as cl, output("CL_with_definition") as cl_with_def, \
+     output("CHEBI") as chebi, output("CHEBI_with_definition") as chebi_with_def:
+    for i in cl_chebi_rows:
+        if "CL" in terms[i]:
+            file_name, file_name_with_def = cl, cl_with_def
+        else:
+            file_name, file_name_with_def = chebi, chebi_with_def
+        eva_name, eva_defn = describe(cl_chebi_nodes[i], i)
+        links = cl_chebi_links.get(i, [])
+        write_atoms(file_name, *eva_name, *links)
+        write_atoms(file_name_with_def, *eva_name, *eva_defn, *links)
 print("Done")
-            
\ No newline at end of file
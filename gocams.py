@@ -99,14 +99,14 @@ def main():
 
     protomapping = pandas.read_csv(args.protomapping, sep='\t',
                                    names=['PR', 'external', 'relation'])
-    result = []
     sif_human = SIF(args.readable_sif)
     sif_ref = SIF(args.db_ref_sif)
-    result += process_sif_file(sif_human, sif_ref, protomapping)
+    # has_name links are generated again for every line a node appears in
+    atoms = AtomTable()
+    atoms.update(process_sif_file(sif_human, sif_ref, protomapping))
 
     with open(args.output, 'wt') as f:
-        for item in result:
-            f.write(item.recursive_print() + '\n')
+        atoms.flush(f)
 
 
 def parse_args():
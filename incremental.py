@@ -0,0 +1,153 @@
+# Incremental imports for the nightly refresh
+# An importer run with --incremental fingerprints its upstream files (sha256 of the content plus the
+# release version and the conversion options) and skips the conversion when the fingerprint is the one
+# of its previous run. When the input changed, the atoms added and removed since the previous run are
+# written next to each output as <output>.added.scm and <output>.removed.scm
+import os
+import re
+import json
+import fcntl
+import hashlib
+import datetime
+from collections import OrderedDict
+
+state_file = "dataset/incremental.json"
+# parentheses, quoted node names and bare words (atom types, stv values)
+token_re = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+
+def fingerprint(paths, *extra):
+    """
+    sha256 of the given files and extra values (version string, options)
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    for value in extra:
+        digest.update(str(value).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+def load_state():
+    if not os.path.isfile(state_file):
+        return OrderedDict()
+    with open(state_file) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+def save_entry(dataset, entry):
+    os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+    # importers run in parallel by knowledge-import.py update the same file
+    with open(state_file + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = load_state()
+        state[dataset] = entry
+        with open(state_file, "w") as f:
+            json.dump(state, f, indent=2)
+
+def unchanged(dataset, state):
+    """
+    True when the previous import of dataset had the same fingerprint and its outputs still exist
+    """
+    entry = load_state().get(dataset)
+    if entry and entry["fingerprint"] == state and all(os.path.exists(p) for p in entry["outputs"].values()):
+        print("{} input is unchanged since {}, skipping the import".format(dataset, entry["date"]))
+        return True
+    return False
+
+def read_atoms(path):
+    """
+    Yield the top level atoms of a .scm file as text
+
+    Files are expected to be written with write_atoms: an atom starts on a line
+    beginning with "(", the lines of its outgoing atoms are indented.
+    """
+    atom = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("(") and atom:
+                yield "".join(atom).rstrip() + "\n"
+                atom = []
+            if atom or line.startswith("("):
+                atom.append(line)
+    if atom:
+        yield "".join(atom).rstrip() + "\n"
+
+def canonical(atom):
+    """
+    Text of an atom with the outgoing atoms of each SetLink sorted by their text, the
+    order of CSetLink.canonical, so an unordered link printed in another order is equal
+    """
+    if "SetLink" not in atom:
+        return atom
+    stack = [[]]
+    for token in token_re.findall(atom):
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            items = stack.pop()
+            head = [x for x in items if not x.startswith("(") or x.startswith("(stv ")]
+            outgoing = [x for x in items if x.startswith("(") and not x.startswith("(stv ")]
+            if items and items[0] == "SetLink":
+                outgoing.sort()
+            stack[-1].append("(" + " ".join(head + ["\n".join(outgoing)] if outgoing else head) + ")")
+        else:
+            stack[-1].append(token)
+    return "\n".join(stack[0]) + "\n"
+
+def atom_digest(atom):
+    return hashlib.blake2b(canonical(atom).encode("utf-8"), digest_size=16).digest()
+
+def write_delta(old_path, new_path):
+    """
+    Write the atoms of new_path missing from old_path to <new_path>.added.scm and
+    the atoms of old_path missing from new_path to <new_path>.removed.scm
+
+    Atoms are compared by the digest of their canonical text, only the digests are kept
+    in memory. Returns the number of added and removed atoms.
+    """
+    base = os.path.splitext(new_path)[0]
+    old = set(atom_digest(atom) for atom in read_atoms(old_path))
+    new = set()
+    added = 0
+    with open(base + ".added.scm", "w") as f:
+        for atom in read_atoms(new_path):
+            digest = atom_digest(atom)
+            if digest not in old and digest not in new:
+                f.write(atom)
+                added += 1
+            new.add(digest)
+    removed = 0
+    with open(base + ".removed.scm", "w") as f:
+        for atom in read_atoms(old_path):
+            digest = atom_digest(atom)
+            if digest not in new:
+                f.write(atom)
+                removed += 1
+                # write duplicates only once
+                new.add(digest)
+    return added, removed
+
+def record(dataset, state, outputs, version=None):
+    """
+    Record a finished import of dataset and write the deltas of its outputs
+
+    outputs maps a name to an output file, each output is compared with the
+    output of the same name of the previous run.
+    """
+    previous = load_state().get(dataset, {}).get("outputs", {})
+    for name, path in outputs.items():
+        old_path = previous.get(name)
+        if old_path is None or not os.path.exists(old_path):
+            print("No previous {} {} output, no delta written".format(dataset, name))
+        elif os.path.abspath(old_path) == os.path.abspath(path):
+            print("The previous {} {} output was overwritten by this import, no delta written".format(dataset, name))
+        else:
+            added, removed = write_delta(old_path, path)
+            print("{} {}: {} atoms added, {} removed since {}".format(dataset, name, added, removed, old_path))
+    entry = OrderedDict()
+    entry["fingerprint"] = state
+    entry["version"] = version
+    entry["date"] = str(datetime.date.today())
+    entry["outputs"] = outputs
+    save_entry(dataset, entry)
@@ -0,0 +1,160 @@
+# Runs the importer scripts of this repository as one build of the MOZI dataset directory
+# Each dataset is a separate python process, datasets that don't depend on each other run in parallel
+
+import argparse
+import datetime
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+root = os.path.dirname(os.path.abspath(__file__))
+
+"""
+    dataset name -> (script, arguments, datasets that have to finish first)
+
+    Dependencies are either real (biogrid_gene2uniprot reads the gene2biogrid.csv written by
+    biogrid_genes2id) or shared files in raw_data that two scripts would otherwise write at
+    the same time (go.obo, chebi.obo). GO_annotation also writes the uniprot2GO output.
+    hgnc_symbols fills the HGNC cache once so the importers don't all download it, chebi does
+    the same for chebi.obo and the ChEBI name index.
+"""
+datasets = OrderedDict([
+    ("hgnc_symbols", ("current_symbols.py", ["--ensure"], [])),
+    ("chebi", ("chebi.py", [], [])),
+    ("biogrid", ("biogrid.py", [], ["hgnc_symbols"])),
+    ("biogrid_genes2id", ("biogrid_genes2id.py", [], [])),
+    ("biogrid_gene2uniprot", ("biogrid_gene2uniprot.py", [], ["hgnc_symbols", "biogrid_genes2id"])),
+    ("coronavirus_biogrid", ("coronavirus_biogrid.py", [], ["hgnc_symbols"])),
+    ("string", ("string_PPI.py", [], ["hgnc_symbols"])),
+    ("GO", ("GO_scm.py", [], [])),
+    ("GO_annotation", ("GO_Annotation_scm.py", [], ["hgnc_symbols", "GO"])),
+    ("go-plus", ("go-plus.py", [], ["GO"])),
+    ("reactome", ("reactome_pathway.py", [], [])),
+    ("reactome_PE", ("PE_Identifier_mapping.py", [], ["hgnc_symbols"])),
+    ("smpdb", ("SMPDB_pathway.py", [], ["hgnc_symbols"])),
+    ("codingRNA", ("codingRNA.py", [], ["hgnc_symbols"])),
+    ("noncodingRNA", ("noncodingRNA.py", [], ["hgnc_symbols"])),
+    ("gene2protein", ("gene2proteinMapping.py", [], ["hgnc_symbols"])),
+    ("gene2celltype", ("PA_gene2celltype.py", [], ["hgnc_symbols"])),
+    ("gene2anatomy", ("gene2anatomy.py", [], ["hgnc_symbols"])),
+    ("pharmagkb", ("pharmagkb.py", ["--output", "dataset/pharmagkb_{}.scm".format(datetime.date.today())], ["hgnc_symbols", "GO"])),
+    ("drugbank", ("drugbank.py", [], ["chebi"])),
+    ("tcmid", ("tcmid.py", [], ["hgnc_symbols", "chebi"])),
+])
+
+# importers that take --incremental, see incremental.py
+incremental_datasets = ["biogrid", "string"]
+
+def with_dependencies(names):
+    """
+    Return the given datasets and everything they depend on, in registry order
+    """
+    selected = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name not in datasets:
+            raise ValueError("Unknown dataset {}, see `knowledge-import.py list`".format(name))
+        if name not in selected:
+            selected.add(name)
+            stack += datasets[name][2]
+    return [name for name in datasets if name in selected]
+
+def run_job(name, log_dir, incremental=False):
+    script, args, _ = datasets[name]
+    command = [sys.executable, os.path.join(root, script)] + args
+    if incremental and name in incremental_datasets:
+        command.append("--incremental")
+    env = dict(os.environ, PYTHONIOENCODING="UTF-8")
+    start = time.time()
+    with open(os.path.join(root, log_dir, name + ".log"), "w") as log:
+        log.write("$ {}\n".format(" ".join(command)))
+        log.flush()
+        returncode = subprocess.call(command, cwd=root, env=env, stdin=subprocess.DEVNULL,
+                                     stdout=log, stderr=subprocess.STDOUT)
+    return returncode, time.time() - start
+
+def run(names, jobs, log_dir, incremental=False):
+    """
+    Run the datasets in dependency order, at most `jobs` at a time
+
+    A dataset whose dependency failed is skipped.
+    Returns name -> (status, seconds) in registry order
+    """
+    for directory in ["raw_data", "dataset", "gene-level", log_dir]:
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    pending = list(names)
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                requires = datasets[name][2]
+                if any(results[dep][0] != "ok" for dep in requires if dep in results):
+                    pending.remove(name)
+                    results[name] = ("skipped", 0.0)
+                    print("{:<22} skipped, a dependency failed".format(name))
+                elif all(dep in results for dep in requires) and len(running) < jobs:
+                    pending.remove(name)
+                    print("{:<22} started".format(name))
+                    running[pool.submit(run_job, name, log_dir, incremental)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, seconds = future.result()
+                status = "ok" if returncode == 0 else "failed ({})".format(returncode)
+                results[name] = (status, seconds)
+                print("{:<22} {} in {:.1f}s".format(name, status, seconds))
+    return OrderedDict((name, results[name]) for name in names)
+
+def print_summary(results, log_dir):
+    print("\n{:<22} {:<12} {:>10}".format("dataset", "status", "seconds"))
+    for name, (status, seconds) in results.items():
+        print("{:<22} {:<12} {:>10.1f}".format(name, status, seconds))
+    print("logs are in {}".format(os.path.join(root, log_dir)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='run the knowledge-import scripts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='import the given datasets (default: all) and their dependencies')
+    run_parser.add_argument('datasets', type=str, nargs='*',
+                            help='datasets to import, see the list command')
+    run_parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                            help='number of importers to run at the same time')
+    run_parser.add_argument('--logs', type=str, default='logs',
+                            help='directory for the per dataset logs')
+    run_parser.add_argument('--dry-run', action='store_true',
+                            help='only print the datasets that would run')
+    run_parser.add_argument('--incremental', action='store_true',
+                            help='skip the datasets whose input is unchanged and write added/removed deltas '
+                                 '({})'.format(", ".join(incremental_datasets)))
+    subparsers.add_parser('list', help='list the datasets and their dependencies')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    """
+    usage:
+        python knowledge-import.py list
+        python knowledge-import.py run
+        python knowledge-import.py run string GO_annotation -j 4
+        python knowledge-import.py run --incremental
+    The HGNC cache used by all importers can be set with HGNC_SYMBOLS_CACHE
+    """
+    arguments = parse_args()
+    if arguments.command == 'list':
+        for name, (script, args, requires) in datasets.items():
+            print("{:<22} {:<28} {}".format(name, script, ", ".join(requires)))
+        sys.exit(0)
+    names = with_dependencies(arguments.datasets or list(datasets))
+    if arguments.dry_run:
+        print("\n".join(names))
+        sys.exit(0)
+    print("started at " + str(datetime.datetime.now()))
+    results = run(names, max(1, arguments.jobs), arguments.logs, arguments.incremental)
+    print_summary(results, arguments.logs)
+    sys.exit(0 if all(status == "ok" for status, _ in results.values()) else 1)
@@ -1,6 +1,7 @@
 import json
 import datetime
 import os
+import fcntl
 from collections import OrderedDict 
 
 def update_meta(version, source, script, genes=None, rna=None, ncrna=None, prot=None, chebi=None, pathways=None, goterms=None,interactions=None):
@@ -31,18 +32,20 @@ def update_meta(version, source, script, genes=None, rna=None, ncrna=None, prot=
   dataset_meta = {dataset_name: [meta_data]}
 
   fname = "dataset/meta.json" 
-  if not os.path.exists(os.path.join(os.getcwd(), 'dataset')):
-    os.makedirs('dataset')
+  os.makedirs('dataset', exist_ok=True)
   
-  if not os.path.isfile(fname):
-    a = []
-    a.append(dataset_meta)
-    with open(fname, mode='w') as f:
-        json.dump(a,f, indent=2)
-  else:
-    with open(fname) as feedsjson:
-        feeds = json.load(feedsjson, object_pairs_hook=OrderedDict)
+  # importers run in parallel by knowledge-import.py update the same file
+  with open(fname + ".lock", "w") as lock:
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    if not os.path.isfile(fname):
+      a = []
+      a.append(dataset_meta)
+      with open(fname, mode='w') as f:
+          json.dump(a,f, indent=2)
+    else:
+      with open(fname) as feedsjson:
+          feeds = json.load(feedsjson, object_pairs_hook=OrderedDict)
 
-    feeds[0][dataset_name] = [meta_data] 
-    with open(fname, mode='w') as f:
-        json.dump(feeds, f, indent=2)  
+      feeds[0][dataset_name] = [meta_data] 
+      with open(fname, mode='w') as f:
+          json.dump(feeds, f, indent=2)  
@@ -35,7 +35,7 @@ with open("dataset/noncodingRNA_{}.scm".format(str(date.today())), 'w') as f:
             genes.append(gene)
             transc = CEvaluationLink(CPredicateNode("transcribed_to"), CListLink(CGeneNode(gene),NcRNANode(rna)))
             transc_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(NcRNANode(rna), CConceptNode("name")))
-            f.write(transc.recursive_print() + "\n" + transc_name.recursive_print() + "\n")
+            write_atoms(f, transc, transc_name)
 
 version = dataset.split(".")[1]
 script = "https://github.com/MOZI-AI/knowledge-import/noncodingRNA.py"
@@ -0,0 +1,84 @@
+# Streaming parser for OBO 1.2/1.4 ontologies (go.obo, chebi.obo, ...)
+# https://owlcollab.github.io/oboformat/doc/GO.format.obo-1_4.html
+
+from collections import namedtuple
+
+"""
+    One record per stanza:
+    * is_a, alt_id - lists of ids, trailing "! comments" and {qualifiers} removed
+    * relationship - list of (relation, id) tuples
+    * synonyms - list of (text, scope) tuples, e.g. ("aspirin", "EXACT")
+    * obsolete - True for "is_obsolete: true"
+    * stanza - "Term", "Typedef" or "Instance"
+"""
+Term = namedtuple("Term", ["id", "name", "namespace", "is_a", "relationship", "alt_id",
+                           "obsolete", "synonyms", "definition", "stanza"])
+
+def strip_comment(value):
+    return value.split(" !")[0].split(" {")[0].strip()
+
+def parse_synonym(value):
+    """
+    Split a synonym value like '"text" EXACT [refs]' into (text, scope)
+    """
+    if not value.startswith('"'):
+        return value, ""
+    end = 1
+    while True:
+        end = value.find('"', end)
+        if end == -1:
+            return value[1:], ""
+        if value[end - 1] != "\\":
+            break
+        end += 1
+    text = value[1:end].replace('\\"', '"')
+    rest = value[end + 1:].split()
+    return text, rest[0] if rest else ""
+
+def make_term(stanza, tags):
+    return Term(id=tags.get("id", [""])[0].strip(),
+                name=tags.get("name", [""])[0],
+                namespace=tags.get("namespace", [""])[0].strip(),
+                is_a=[strip_comment(v) for v in tags.get("is_a", [])],
+                relationship=[tuple(strip_comment(v).split()[:2]) for v in tags.get("relationship", [])],
+                alt_id=[strip_comment(v) for v in tags.get("alt_id", [])],
+                obsolete=tags.get("is_obsolete", ["false"])[0].strip() == "true",
+                synonyms=[parse_synonym(v) for v in tags.get("synonym", [])],
+                definition=parse_synonym(tags["def"][0])[0] if "def" in tags else "",
+                stanza=stanza)
+
+def read_stanzas(path):
+    """
+    Yield (stanza type, {tag: [values]}) for each stanza, the header has the type None
+
+    Only the stanza being read is kept in memory. Undecodable bytes become U+FFFD
+    instead of being dropped, so a corrupt name shows up in the output.
+    """
+    stanza = None
+    tags = {}
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.startswith("[") and line.endswith("]"):
+                yield stanza, tags
+                stanza = line[1:-1]
+                tags = {}
+            elif line and not line.startswith("!"):
+                tag, _, value = line.partition(":")
+                tags.setdefault(tag, []).append(value.strip())
+    yield stanza, tags
+
+def read_header(path):
+    """
+    Return the header tags of an obo file as {tag: [values]}
+    """
+    for stanza, tags in read_stanzas(path):
+        return tags
+
+def read_obo(path, stanzas=("Term",)):
+    """
+    Yield a Term for every stanza of the given types, in file order
+    """
+    for stanza, tags in read_stanzas(path):
+        if stanza in stanzas:
+            yield make_term(stanza, tags)
@@ -6,9 +6,14 @@ http://pharmgkb.org
 __author__ = "Anatoly Belikov"
 __email__ = "abelikov@singularitynet.io"
 
+import os
 import re
+import shutil
+import tempfile
 import urllib.request
 import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import xml.etree.ElementTree as ET
 from zipfile import ZipFile
 from gzip import GzipFile
@@ -16,6 +21,7 @@ from io import BytesIO
 import pandas
 from atomwrappers import *
 import find_gons
+import current_symbols
 
 
 chebi_re = re.compile(".*ChEBI:CHEBI:(\d+).*")
@@ -27,14 +33,72 @@ re_dict['ChEBI'] = [chebi_re]
 re_dict['PubChem'] = [pubchem_re, pubchem_re_sub]
 re_dict['DrugBank'] = [drugbank_re]
 
+"""
+    Lookup tables built once from the pharmagkb tables:
+    * ChemicalIndex.ids - PharmGKB accession: list of {database name: id} from the cross-references
+    * ChemicalIndex.accessions - chemical name: list of PharmGKB accessions
+    * ChebiIndex.by_id, ChebiIndex.by_name - pharma_id or Name: list of ChEBI ids from pharma2chebi
+"""
+ChemicalIndex = namedtuple("ChemicalIndex", ["ids", "accessions"])
+ChebiIndex = namedtuple("ChebiIndex", ["by_id", "by_name"])
+
+
+def parse_references(references):
+    chemical_id = dict()
+    if isinstance(references, str):
+        for id_type, reglist in re_dict.items():
+            for regex in reglist:
+                match = regex.match(references)
+                if match:
+                    for num in match.groups():
+                        chemical_id[id_type] = num
+    return chemical_id
+
 
-def pharma_to_id(chem_table, name):
+def index_chemicals(chem_table):
+    ids = dict()
+    accessions = dict()
+    for accession, name, references in zip(chem_table['PharmGKB Accession Id'],
+                                           chem_table['Name'],
+                                           chem_table['Cross-references']):
+        # rows without accession can't be looked up by id, NaN != NaN
+        if isinstance(accession, str):
+            ids.setdefault(accession, []).append(parse_references(references))
+        accessions.setdefault(name, []).append(accession)
+    return ChemicalIndex(ids, accessions)
+
+
+def index_uniprot(pharma2uniprot):
     """
-    extract references to the substance from chem_table
+    Map "pharma_id;" to the uniprot entries, only the reviewed ones if there are any
+    """
+    entries = dict()
+    for pharma_id, entry, status in zip(pharma2uniprot.pharma_id, pharma2uniprot.Entry, pharma2uniprot.Status):
+        entries.setdefault(pharma_id, []).append((entry, status))
+    index = dict()
+    for pharma_id, rows in entries.items():
+        # drop unreviewed if possible
+        reviewed = [entry for (entry, status) in rows if status == 'reviewed']
+        index[pharma_id] = reviewed or [entry for (entry, status) in rows]
+    return index
+
+
+def index_chebi(pharma2chebi):
+    by_id = dict()
+    by_name = dict()
+    for pharma_id, name, chebi in zip(pharma2chebi.pharma_id, pharma2chebi.Name, pharma2chebi.ChEBI):
+        by_id.setdefault(pharma_id, []).append(chebi)
+        by_name.setdefault(name, []).append(chebi)
+    return ChebiIndex(by_id, by_name)
+
+
+def pharma_to_id(chemicals, name):
+    """
+    extract references to the substance from the chemicals index
 
     Parameters:
     -----------
-    chem_table: pandas.DataFrame
+    chemicals: ChemicalIndex
         pharagkb chemicals
     name: str
         pharmagkb id for the substance
@@ -44,22 +108,12 @@ def pharma_to_id(chem_table, name):
     dict
         database name: id pairs
     """
-    chem = chem_table[chem_table['PharmGKB Accession Id'] == name]
+    chem = chemicals.ids.get(name, [])
     if not len(chem):
         print("Not found chemical row for {0}".format(name))
         return dict() 
     assert len(chem) == 1
-    references = chem['Cross-references'].tolist()
-    chemical_id = dict()
-
-    for r in references:
-        if isinstance(r, str):
-            for id_type, reglist in re_dict.items():
-                for regex in reglist:
-                    match = regex.match(r)
-                    if match:
-                        for num in match.groups():
-                            chemical_id[id_type] = num
+    chemical_id = dict(chem[0])
     # todo: convert PubChem to ChEBI if possible
     if not chemical_id:
         print("Not found pubchem or chebi id for {0}".format(name))
@@ -117,8 +171,8 @@ def gen_proteins(pharma_id, name, pathway_id, pharma2uniprot):
         pharma gkb id for protein
     pathway_id: str
         pharma gkb id for pathway
-    genes_data: pandas.DataFrame
-        table of genes data
+    pharma2uniprot: dict
+        uniprot entries by "pharma_id;", see index_uniprot
         
     Returns
     -------
@@ -129,15 +183,11 @@ def gen_proteins(pharma_id, name, pathway_id, pharma2uniprot):
     tmp = []
     proteins = []
     for prot in pharma_id:
-        entry = pharma2uniprot[pharma2uniprot.pharma_id == prot + ';']
-        # drop unreviewed if possible
-        if 'reviewed' in entry.Status.tolist():
-            entry = entry[entry.Status == 'reviewed']
+        entry = pharma2uniprot.get(prot + ';', [])
         if not len(entry):
             print("not found uniprot id for {0}".format(name))
             continue
-        for i in range(len(entry)):
-            prot_id = entry.iloc[i].Entry
+        for prot_id in entry:
             molecule = find_mol_type('Uniprot:{0}'.format(prot_id))
             member = CMemberLink(molecule,
                                 PharmGkbNode(pathway_id))
@@ -173,15 +223,15 @@ def generate_locations(elem, ns, chemical_nodes, pathway_id):
 
 def find_chebi(pubchem, drugbank, name, pharma_id, pharma2chebi):
     if pharma_id:
-        frame = pharma2chebi[pharma2chebi.pharma_id == pharma_id]
+        frame = pharma2chebi.by_id.get(pharma_id, [])
         if len(frame):
-            assert len(set(frame['ChEBI'].to_list())) == 1
-            return frame.iloc[0]['ChEBI']
+            assert len(set(frame)) == 1
+            return frame[0]
     if name:
-        frame = pharma2chebi[pharma2chebi.Name == name]
+        frame = pharma2chebi.by_name.get(name, [])
         if len(frame):
             assert len(frame) == 1
-            return frame.iloc[0]['ChEBI']
+            return frame[0]
 
 
 def parse_molecule(smallmolecule, ns, chem_data, pharma2chebi=None):
@@ -194,8 +244,8 @@ def parse_molecule(smallmolecule, ns, chem_data, pharma2chebi=None):
         SmallMolecule
     ns: dict
         namespaces from the owl file
-    chem_data: pandas.DataFrame
-        table chemicals from pharagkb
+    chem_data: ChemicalIndex
+        chemicals from pharagkb
     
     Returns
     -------
@@ -212,10 +262,10 @@ def parse_molecule(smallmolecule, ns, chem_data, pharma2chebi=None):
         if pharma_pkg_id is None:
             # try by standard name
 
-            row = chem_data[chem_data.Name == name]
+            row = chem_data.accessions.get(name, [])
             if len(row):
                 assert len(row) == 1
-                pharma_pkg_id = row.iloc[0]['PharmGKB Accession Id']
+                pharma_pkg_id = row[0]
             else:
                 print("no pharmapkg id for {0}".format(value))
                 continue
@@ -245,7 +295,7 @@ def parse_molecule(smallmolecule, ns, chem_data, pharma2chebi=None):
 
 def process_small_molecules(pathway, ns, pathway_id, chem_data, id_map, pharma2chebi=None):
     tmp = list()
-    for smallmolecule in pathway.findall('./bp:SmallMolecule', ns):
+    for smallmolecule in pathway.findall('SmallMolecule'):
         molecule_drug, name = parse_molecule(smallmolecule, ns, chem_data, pharma2chebi)
         molecule = None
         for db_name in ('ChEBI', 'PubChem', 'DrugBank'):
@@ -297,7 +347,7 @@ def parse_protein(protein, pathway, ns, pathway_id, pharma2uniprot, elem_chemica
         elem_chemical_map[protein_elem_id] = []
         return []
     ent_ref_id = resource(reference_elem, ns)
-    ent_ref = pathway.find('./*[@rdf:about="{0}"]'.format(ent_ref_id), ns)
+    ent_ref = find_about_element(pathway, ns, ent_ref_id)
     protein_ref_id = []
     if ent_ref.tag.endswith('ProteinReference'):
         # it is ether protein group or a protein
@@ -341,10 +391,10 @@ def parse_protein(protein, pathway, ns, pathway_id, pharma2uniprot, elem_chemica
 def process_proteins(pathway, ns, pathway_id, genes_data, pharma2uniprot, elem_chemical_map):
     tmp = list()
     # properties often don't have valid attributes 
-    for protein in pathway.findall('./bp:Protein', ns):
+    for protein in pathway.findall('Protein'):
         parse_protein(protein, pathway, ns, pathway_id, pharma2uniprot, elem_chemical_map, tmp=tmp)
     # Complex is expected to be made of proteins
-    for comp in pathway.findall('./bp:Complex', ns):
+    for comp in pathway.findall('Complex'):
         tmp += parse_elem(comp, pathway, ns, pathway_id, elem_chemical_map)
     return tmp
 
@@ -381,8 +431,8 @@ def gen_interaction(interaction, pathway, pathway_id, ns, id_map, interaction_na
         return result
     left = resource(left_elem, ns)
     right = resource(right_elem, ns)
-    parse_elem(pathway.find('./*[@rdf:about="{0}"]'.format(left), ns), pathway, ns, pathway_id, id_map)
-    parse_elem(pathway.find('./*[@rdf:about="{0}"]'.format(right), ns), pathway, ns, pathway_id, id_map)      
+    parse_elem(find_about_element(pathway, ns, left), pathway, ns, pathway_id, id_map)
+    parse_elem(find_about_element(pathway, ns, right), pathway, ns, pathway_id, id_map)      
     left_mol = id_map.get(left, ())
     right_mol = id_map.get(right, ())
     ev = None
@@ -404,7 +454,7 @@ def parse_subelements(interaction, xpath, pathway, pathway_id, ns, id_map):
     left_items = list()
     for left in interaction.findall(xpath, ns):
         left_id = resource(left, ns)
-        parse_elem(pathway.find('./*[@rdf:about="{0}"]'.format(left_id), ns), pathway, ns, pathway_id, id_map)
+        parse_elem(find_about_element(pathway, ns, left_id), pathway, ns, pathway_id, id_map)
         left_items += id_map.get(left_id, [])
     return left_items
 
@@ -439,7 +489,7 @@ def parse_control(control, pathway, ns, pathway_id, id_map):
         id_map[about(control, ns)] = result
         return result
     controller_id = resource(controller_el, ns)
-    controller = process_component(pathway.find('./*[@rdf:about="{0}"]'.format(controller_id), ns), 
+    controller = process_component(find_about_element(pathway, ns, controller_id), 
                                    pathway, ns, pathway_id, id_map, [])
     # controlled is a some interaction or control
     controlled_id = control.find('./bp:controlled[@rdf:resource]', ns).attrib['{{{0}}}resource'.format(ns['rdf'])]
@@ -492,7 +542,7 @@ def parse_catalysis(element, pathway, ns, pathway_id, id_map):
         id_map[about(element, ns)] = []
         return result
     controller_id = resource(controller_el, ns)
-    controller = process_component(pathway.find('./*[@rdf:about="{0}"]'.format(controller_id), ns), 
+    controller = process_component(find_about_element(pathway, ns, controller_id), 
                                    pathway, ns, pathway_id, id_map, result=result)
     # controled is a some interaction
     controlled_id = resource(element.find('./bp:controlled[@rdf:resource]', ns), ns)
@@ -512,8 +562,35 @@ def parse_catalysis(element, pathway, ns, pathway_id, id_map):
     return result
 
 
+class BiopaxIndex:
+    """
+    Index of the top level elements of a BioPAX document, built in one pass
+
+    * about - rdf:about: element
+    * types - element type (e.g. "Protein"): list of elements in document order
+    For duplicated ids the first element is kept, like ElementTree.find
+    """
+    def __init__(self, root, ns):
+        self.root = root
+        self.ns = ns
+        self.about = dict()
+        self.types = dict()
+        about_attr = '{{{0}}}about'.format(ns['rdf'])
+        for elem in root:
+            elem_id = elem.get(about_attr)
+            if elem_id is not None:
+                self.about.setdefault(elem_id, elem)
+            self.types.setdefault(elem.tag, []).append(elem)
+
+    def find_about(self, elem_id):
+        return self.about.get(elem_id)
+
+    def findall(self, elem_type):
+        return self.types.get('{{{0}}}{1}'.format(self.ns['bp'], elem_type), [])
+
+
 def find_about_element(pathway, ns, elem_id):
-    return pathway.find('./*[@rdf:about="{0}"]'.format(elem_id), ns)
+    return pathway.find_about(elem_id)
 
 
 def parse_elem(elem, pathway, ns, pathway_id, id_map):
@@ -754,9 +831,10 @@ def process_component(interaction, pathway, ns, pathway_id, id_map, result):
 
 def process_components(pathway, ns, pathway_id, id_map):
     result = list()
-    for component in pathway.findall('bp:Pathway/bp:pathwayComponent', ns):
+    components = [c for p in pathway.findall('Pathway') for c in p.findall('bp:pathwayComponent', ns)]
+    for component in components:
         for comp in component.attrib.values():
-            interaction = pathway.find('./*[@rdf:about="{0}"]'.format(comp), ns)
+            interaction = find_about_element(pathway, ns, comp)
             process_component(interaction, pathway, ns, pathway_id, id_map, result=result)
     return result
         
@@ -772,34 +850,30 @@ def convert_pathway(pathway, chem_data, genes_data, pharma2uniprot, pathway_id,
                   PharmGkbNode(pathway_id),
                   CConceptNode('pathway')))
     id_map = dict()
+    # element lookups by id instead of xpath queries over the whole document
+    pathway = BiopaxIndex(pathway, ns)
     tmp += process_proteins(pathway, ns, pathway_id, genes_data, pharma2uniprot, id_map)
     tmp += process_small_molecules(pathway, ns, pathway_id, chem_data, id_map, pharma2chebi)
     tmp += process_components(pathway, ns, pathway_id, id_map)
-    return '\n'.join([x.recursive_print() for x in tmp])
+    return tmp
 
 
 # https://effbot.org/zone/element-namespaces.htm
-def parse_map(source_file):
+def parse_document(source_file):
     """
-    Extract namespaces from xml file
-    """
-
-    events = "start", "start-ns", "end-ns"
-
-    root = None
-    ns_map = []
-    result = dict()
-    for event, elem in ET.iterparse(source_file, events):
-        if event == "start-ns":
-            ns_map.append(elem)
-        elif event == "end-ns":
-            ns_map.pop()
-        elif event == "start":
-            if root is None:
-                root = elem
-            result.update(dict(ns_map))
+    Parse xml file in one pass
 
-    return result
+    Returns
+    -------
+    xml.etree.ElementTree.Element, dict
+        root element
+        prefix: namespace pairs declared in the file
+    """
+    ns = dict()
+    parser = ET.iterparse(source_file, events=("start-ns",))
+    for event, (prefix, uri) in parser:
+        ns[prefix] = uri
+    return parser.root, ns
 
 
 PATHWAY_RE = re.compile('(PA\d+)-(\w+).owl')
@@ -864,28 +938,83 @@ def parse_args():
                         help='path to pharma2uniprot file')
     parser.add_argument('--pharma2chebi', type=str, default='',
                         help='pharma2chebi mapping file')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of processes converting pathways at the same time')
+    current_symbols.add_arguments(parser)
     return parser.parse_args()
 
 
 def remove_duplicates(pharma2uniprot):
-    loc_entry = ([(i,pharma2uniprot.iloc[i]) for (i,x) in enumerate(pharma2uniprot['Cross-reference (PharmGKB)'].tolist()) if x.count('PA') > 1])
-    table = pharma2uniprot.iloc[0:0]
-    prev_iloc = 0
-    for (iloc, entry) in loc_entry:
-        table = table.append(pharma2uniprot.iloc[prev_iloc: iloc])
-        for pharma_gkb_id in entry['Cross-reference (PharmGKB)'].split(';'):
-            if pharma_gkb_id:
-                new_entry = entry.copy()
-                new_entry['Cross-reference (PharmGKB)'] = pharma_gkb_id + ';'
-                table = table.append(new_entry)
-        prev_iloc = iloc + 1
-    table = table.append(pharma2uniprot.iloc[prev_iloc:])
-    table = table.rename(columns={'Cross-reference (PharmGKB)': 'pharma_id'})
+    """
+    Split the entries with several pharmagkb ids into one row per id, in the same order
+    """
+    column = 'Cross-reference (PharmGKB)'
+    multiple = pharma2uniprot[column].str.count('PA') > 1
+    ids = pharma2uniprot.loc[multiple, column].str.split(';').explode()
+    ids = ids[ids != ''] + ';'
+    expanded = pharma2uniprot.loc[ids.index].assign(**{column: ids.values})
+    table = pandas.concat([pharma2uniprot[~multiple], expanded]).sort_index(kind='stable')
+    table = table.rename(columns={column: 'pharma_id'})
     return table
 
 
+# chem_data, genes_data, pharma2uniprot and pharma2chebi indexes, read only once loaded
+tables = dict()
+
+
+def set_tables(lookup_tables):
+    """
+    Set the lookup tables used by convert_file, also the initializer of the worker processes
+    """
+    global tables
+    tables = lookup_tables
+
+
+def convert_file(filename, data, output):
+    """
+    Convert one pathway owl file and write its atoms to output
+    """
+    tree, ns = parse_document(BytesIO(data))
+    pathway_id, pathway_name = get_pathway_id_name(tree, ns)
+    if pathway_id is None:
+        pathway_id = filename.split('-')[0]
+    atoms = convert_pathway(tree, tables['chem_data'], tables['genes_data'],
+                            tables['pharma2uniprot'], pathway_id, pathway_name, ns,
+                            tables['pharma2chebi'])
+    write_atoms(output, *atoms)
+    output.write('\n' * 2)
+
+
+def convert_shard(filename, data, shard):
+    with open(shard, 'wt') as output:
+        convert_file(filename, data, output)
+    return shard
+
+
+def convert_parallel(pathway_file, pathway_files, output, jobs):
+    """
+    Convert the pathways in `jobs` processes
+
+    Every pathway is written to its own shard in a temporary directory,
+    the shards are copied to output in the order of pathway_files.
+    """
+    shard_dir = tempfile.mkdtemp(prefix='pharmagkb-', dir=os.path.dirname(os.path.abspath(output.name)))
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=set_tables, initargs=(tables,)) as pool:
+            futures = []
+            for i, filename in enumerate(pathway_files):
+                shard = os.path.join(shard_dir, '{0:05d}.scm'.format(i))
+                futures.append(pool.submit(convert_shard, filename, pathway_file.read(filename), shard))
+            for future in futures:
+                with open(future.result(), 'rt') as f:
+                    shutil.copyfileobj(f, output)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+
 def main():
     args = parse_args()
+    current_symbols.configure(args)
     if (args.pathways and args.genes and args):
         pathway_file = ZipFile(BytesIO(open(args.pathways, 'rb').read()))
         chemicals_file = ZipFile(BytesIO(open(args.chemicals, 'rb').read()))
@@ -912,23 +1041,20 @@ def main():
     genes_data = pandas.read_csv(genes_tsv, sep="\t")
     chem_data = pandas.read_csv(chem_tsv, sep="\t")
     pharma2uniprot = remove_duplicates(pandas.read_csv(pharma2uniprot_file, sep='\t'))
+    set_tables(dict(chem_data=index_chemicals(chem_data), genes_data=genes_data,
+                    pharma2uniprot=index_uniprot(pharma2uniprot), pharma2chebi=index_chebi(pharma2chebi)))
     
     pathway_files = [x for x in pathway_file.namelist() if x.endswith('.owl')]
 
     out_path = args.output
     output = open(out_path, 'wt')
-    for filename in pathway_files:
-        extracted_file = pathway_file.open(filename).read()
-        tree = ET.fromstring(extracted_file)
-        ns = parse_map(pathway_file.open(filename))
-        pathway_id, pathway_name = get_pathway_id_name(tree, ns)
-        if pathway_id is None:
-            pathway_id = filename.split('-')[0]
-        res = convert_pathway(tree, chem_data, genes_data, 
-                              pharma2uniprot, pathway_id, pathway_name, ns,
-                              pharma2chebi)
-        output.write(res)
-        output.write('\n' * 3)
+    if args.jobs > 1:
+        # index go.obo once, not in every worker
+        find_gons.load_namespace().close()
+        convert_parallel(pathway_file, pathway_files, output, args.jobs)
+    else:
+        for filename in pathway_files:
+            convert_file(filename, pathway_file.read(filename), output)
     output.close()
 
 
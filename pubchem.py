@@ -0,0 +1,112 @@
+# Maps PubChem substance ids (SID) to compound ids (CID)
+# The answers are kept in raw_data/pubchem-sid2cid.db, including the substances without a compound,
+# so PubChem is only asked once per SID. Unknown SIDs are requested in batches with PUG-REST
+# https://pubchem.ncbi.nlm.nih.gov/docs/pug-rest
+import os
+import asyncio
+import sqlite3
+import requests
+import json
+
+store_path = os.environ.get("PUBCHEM_CACHE", "raw_data/pubchem-sid2cid.db")
+base_url = os.environ.get("PUBCHEM_URL", "https://pubchem.ncbi.nlm.nih.gov/rest/pug")
+batch_size = 100
+# batches requested at the same time (PubChem allows 5 requests per second),
+# retries per batch and the first retry delay in seconds
+concurrency = 3
+retries = 3
+backoff = 1.0
+
+def open_cache(path=None):
+    """
+    Open the SID -> CID cache, cid is NULL for substances without a compound
+    """
+    conn = sqlite3.connect(path or store_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS sid2cid (sid TEXT PRIMARY KEY, cid TEXT) WITHOUT ROWID")
+    return conn
+
+def cached(conn, sids):
+    found = {}
+    for sid in sids:
+        row = conn.execute("SELECT cid FROM sid2cid WHERE sid = ?", (sid,)).fetchone()
+        if row is not None:
+            found[sid] = row[0]
+    return found
+
+def get_cids(sids, path=None):
+    """
+    Return SID -> CID for the given SIDs, None for the substances without a compound
+
+    SIDs missing from the cache are requested from PubChem and stored. SIDs of
+    batches that failed are left out of the result and asked again next time.
+    """
+    sids = sorted(set(str(sid) for sid in sids))
+    conn = open_cache(path)
+    try:
+        found = cached(conn, sids)
+        missing = [sid for sid in sids if sid not in found]
+        if missing:
+            print("Requesting the PubChem CID of {} SIDs".format(len(missing)))
+            resolved = asyncio.run(resolve_sids(missing))
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO sid2cid VALUES (?, ?)", resolved.items())
+            found.update(resolved)
+    finally:
+        conn.close()
+    return found
+
+async def resolve_sids(sids):
+    """
+    Resolve SIDs in batches of batch_size, at most `concurrency` requests at a time
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [sids[i:i + batch_size] for i in range(0, len(sids), batch_size)]
+    results = await asyncio.gather(*[fetch_batch(batch, semaphore) for batch in batches],
+                                   return_exceptions=True)
+    found = {}
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            print("=== Failed to get the PubChem CID of {} SIDs: {}".format(len(batch), result))
+        else:
+            found.update(result)
+    return found
+
+async def fetch_batch(sids, semaphore):
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.to_thread(request_batch, sids)
+            except (requests.RequestException, RuntimeError):
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+def request_batch(sids):
+    """
+    Return SID -> first CID (or None) for a list of SIDs
+
+    PubChem answers 404 when none of the SIDs has a compound. A batch rejected
+    as invalid (400) is retried SID by SID.
+    """
+    requestURL = "{}/substance/sid/cids/JSON".format(base_url)
+    result = requests.post(requestURL, data={"sid": ",".join(sids)}, timeout=30)
+    if result.ok:
+        found = dict.fromkeys(sids)
+        for info in json.loads(result.text)["InformationList"]["Information"]:
+            sid = str(info["SID"])
+            if sid in found and info.get("CID"):
+                found[sid] = str(info["CID"][0])
+        return found
+    elif result.status_code == 404:
+        return dict.fromkeys(sids)
+    elif result.status_code == 400:
+        if len(sids) == 1:
+            return {sids[0]: None}
+        found = {}
+        for sid in sids:
+            found.update(request_batch([sid]))
+        return found
+    else:
+        raise RuntimeError("Failure to get result from {} ({})".format(requestURL, result.status_code))
@@ -53,14 +53,14 @@ with open(output, 'w') as f:
         pw_name = pathway_list.iloc[i]['name']
         pw_id = pathway_list.iloc[i]['ID']
         eva_name = CEvaluationLink(CPredicateNode("has_name"), CListLink(ReactomeNode(pw_id), CConceptNode(pw_name)))
-        f.write(eva_name.recursive_print() + "\n")
+        write_atoms(f, eva_name)
 
     for i in range(len(pathway_relation)):
         pw_parent = pathway_relation.iloc[i]['parent']
         pw_child = pathway_relation.iloc[i]['child']										
         if homosapien(pw_child) and homosapien(pw_parent): 
             inherit = CInheritanceLink(ReactomeNode(pw_child), ReactomeNode(pw_parent))
-            f.write(inherit.recursive_print() + "\n")						
+            write_atoms(f, inherit)
 
 num_pathways = {"Reactome Pathway": len(set(pathways))}
 metadata.update_meta("Reactome Pathways relationship:latest", 
@@ -2,137 +2,201 @@
 # String PPI dataset https://stringdb-static.org/download/protein.actions.v11.0/9606.protein.actions.v11.0.txt.gz
 # Columns definition http://www.string-db.org/help/faq/#what-does-the-columns-in-proteinsactions-file-mean
 
+import argparse
+import numpy as np
 import pandas as pd
 import wget
 import os
-import sys
-import metadata
 import datetime
+import current_symbols
+import incremental
 from atomwrappers import *
 
 source = "https://stringdb-static.org/download/protein.actions.v11.0/9606.protein.actions.v11.0.txt.gz"
 mapping = "https://string-db.org/mapping_files/uniprot/human.uniprot_2_string.2018.tsv.gz"
 
-def import_string():
-    print("started at " + str(datetime.datetime.now()))
-    if not os.path.exists('raw_data/9606.protein.actions.v11.0.txt.gz'):
-        wget.download(source,"raw_data/")
-    if not os.path.exists('raw_data/human.uniprot_2_string.2018.tsv.gz'):
-        wget.download(mapping,"raw_data/")
-    
-    df_data = pd.read_csv("raw_data/9606.protein.actions.v11.0.txt.gz", dtype=str, sep="\t")
-    df_data = df_data.drop_duplicates(subset=['item_id_a', 'item_id_b', 'mode'], keep='first')
-    df_data_symmetric = df_data[df_data['is_directional'] == "f"]
-    df_data_asymmetric = df_data[df_data['is_directional'] == "t"]
-    df_mapping = pd.read_csv("raw_data/human.uniprot_2_string.2018.tsv.gz", dtype=str, sep="\t", names=["code", "uniprot", "ensembl","num1","num2"])
-   
-    # create a mapping dictionary
-    mapping_dict = {} 
-    for e in df_mapping["ensembl"]:
-        if not e in mapping_dict.keys():
-            mapping_dict[e] = df_mapping[df_mapping["ensembl"] == e]["uniprot"].values[0]
-    print("Done with the Dict, importing into atomese")
-    print(len(df_data))
+interaction_modes = ["catalysis","inhibition","expression","activation","binding","reaction","ptmod"]
+# bump when the conversion changes, so incremental imports don't skip unchanged input
+converter_version = 1
+COLUMNS = ['item_id_a', 'item_id_b', 'mode', 'is_directional', 'a_is_acting', 'score']
+
+"""
+    If the directionality of the interaction is true and a is acting, use ListLink and keep the order. Otherwise use SetLink
+    * is_directional - describes if the diractionality of the particular interaction is known.
+    * a_is_acting - the directionality of the action if applicable ('t' gives that item_id_a is acting upon item_id_b)
+    Example:
+    item_id_a   item_id_b   mode    is_directional  a_is_acting
+    ENSP00000000233	ENSP00000216366 reaction    f   f
+    <=> EvaluationLink
+            PredicateNode "reaction"
+            SetLink ENSP00000000233 ENSP00000216366
+
+    ENSP00000000233	ENSP00000216366 reaction    t   f
+    <=> EvaluationLink
+            PredicateNode "reaction"
+            ListLink ENSP00000216366 ENSP00000000233
+    ENSP00000000233	ENSP00000216366	reaction    t   t
+    <=> EvaluationLink
+            PredicateNode "reaction"
+            ListLink ENSP00000000233 ENSP00000216366
+
+    Keep symmetric relations and ignore if the same relation happens to be asymmetric
+"""
+
+def fetch(url):
+    if os.path.isfile(url):
+        return url
+    path = os.path.join("raw_data", url.split("/")[-1])
+    if not os.path.exists(path):
+        wget.download(url, "raw_data/")
+    return path
+
+def load_mapping(path):
+    df_mapping = pd.read_csv(path, dtype=str, sep="\t", names=["code", "uniprot", "ensembl","num1","num2"])
+    # create a mapping dictionary, the first uniprot listed for an ensembl id wins
+    return df_mapping.drop_duplicates(subset="ensembl").set_index("ensembl")["uniprot"].to_dict()
+
+def map_proteins(df_data, mapping_dict):
+    """
+    Add uniprot_a/b and gene_a/b columns from the "UNIPROT|GENE_HUMAN" mapping values
+
+    Unmapped ensembl ids are left as NaN.
+    """
+    df_data = df_data.copy()
+    for side in ('a', 'b'):
+        mapped = df_data['item_id_' + side].map(mapping_dict).str.split("|")
+        df_data['uniprot_' + side] = mapped.str[0]
+        df_data['gene_' + side] = mapped.str[1].str.split("_").str[0].str.upper()
+    return df_data
+
+def read_actions(path, mapping_dict, modes, chunksize, min_score=0):
+    """
+    Read the actions file in chunks, keeping only mapped rows of the given modes
+    with score >= min_score
+
+    Duplicates are dropped per chunk against the (item_id_a, item_id_b, mode) keys
+    seen so far, so only the rows above the lowest cutoff are kept in memory.
+    Returns the deduplicated actions and the list of ensembl ids without a uniprot
+    """
+    frames = []
     notmapped = []
+    seen = set()
+    for chunk in pd.read_csv(path, dtype=str, sep="\t", usecols=COLUMNS, chunksize=chunksize):
+        chunk = map_proteins(chunk[chunk['mode'].isin(modes)], mapping_dict)
+        notmapped += chunk.loc[chunk['uniprot_a'].isna(), 'item_id_a'].tolist()
+        notmapped += chunk.loc[chunk['uniprot_a'].notna() & chunk['uniprot_b'].isna(), 'item_id_b'].tolist()
+        chunk = chunk.dropna(subset=['uniprot_a', 'gene_a', 'uniprot_b', 'gene_b'])
+        chunk = chunk.drop_duplicates(subset=['item_id_a', 'item_id_b', 'mode'], keep='first')
+        keys = list(zip(chunk['item_id_a'], chunk['item_id_b'], chunk['mode']))
+        first = np.fromiter((key not in seen for key in keys), dtype=bool, count=len(keys))
+        seen.update(keys)
+        chunk = chunk[first].assign(score=chunk['score'][first].astype(int))
+        frames.append(chunk[chunk['score'] >= min_score].drop(columns=['item_id_a', 'item_id_b']))
+    return pd.concat(frames, ignore_index=True), notmapped
 
+def convert(df_data, min_score, f, g, proteins, genes):
     """
-        If the directionality of the interaction is true and a is acting, use ListLink and keep the order. Otherwise use SetLink
-        * is_directional - describes if the diractionality of the particular interaction is known.
-        * a_is_acting - the directionality of the action if applicable ('t' gives that item_id_a is acting upon item_id_b)
-        Example:
-        item_id_a   item_id_b   mode    is_directional  a_is_acting
-        ENSP00000000233	ENSP00000216366 reaction    f   f   
-        <=> EvaluationLink 
-                PredicateNode "reaction"
-                SetLink ENSP00000000233 ENSP00000216366
-
-        ENSP00000000233	ENSP00000216366 reaction    t   f
-        <=> EvaluationLink 
-                PredicateNode "reaction"
-                ListLink ENSP00000216366 ENSP00000000233
-        ENSP00000000233	ENSP00000216366	reaction    t   t
-        <=> EvaluationLink 
-                PredicateNode "reaction"
-                ListLink ENSP00000000233 ENSP00000216366
-    
-        Keep symmetric relations and ignore if the same relation happens to be asymmetric
+    Write PPI links to f and GGI links to g for actions with score >= min_score
+
+    df_data is already cut at the lowest score, only the higher cutoffs filter here.
+    proteins and genes cache the nodes between calls.
+    """
+    df_data = df_data[df_data['score'] >= min_score]
+    for prot in pd.unique(np.concatenate([df_data['uniprot_a'].values, df_data['uniprot_b'].values])):
+        if prot not in proteins:
+            proteins[prot] = ProteinNode(prot)
+    for gene in pd.unique(np.concatenate([df_data['gene_a'].values, df_data['gene_b'].values])):
+        if gene not in genes:
+            genes[gene] = CGeneNode(gene)
+    df_data = df_data.assign(name_a=df_data['gene_a'].map(lambda x: genes[x].name),
+                             name_b=df_data['gene_b'].map(lambda x: genes[x].name))
+    df_symmetric = df_data[df_data['is_directional'] == "f"]
+    df_asymmetric = df_data[df_data['is_directional'] == "t"]
+
+    # drop asymmetric actions that are also listed as symmetric for the same genes and mode
+    keys = ['name_a', 'name_b', 'mode']
+    merged = df_asymmetric[keys].merge(df_symmetric[keys].drop_duplicates(), on=keys, how='left', indicator=True)
+    df_asymmetric = df_asymmetric[(merged['_merge'] == 'left_only').to_numpy()]
+
+    # put the acting interactor first
+    swap = (df_asymmetric['a_is_acting'] != "t").to_numpy()
+    df_asymmetric = df_asymmetric.assign(
+        uniprot_a=np.where(swap, df_asymmetric['uniprot_b'], df_asymmetric['uniprot_a']),
+        uniprot_b=np.where(swap, df_asymmetric['uniprot_a'], df_asymmetric['uniprot_b']),
+        gene_a=np.where(swap, df_asymmetric['gene_b'], df_asymmetric['gene_a']),
+        gene_b=np.where(swap, df_asymmetric['gene_a'], df_asymmetric['gene_b']))
+
+    columns = ['uniprot_a', 'gene_a', 'uniprot_b', 'gene_b', 'mode', 'score']
+    for link, rows in ((CSetLink, df_symmetric[columns]), (CListLink, df_asymmetric[columns])):
+        for prot1, gene1, prot2, gene2, mode, score in rows.itertuples(index=False):
+            stv = "(stv {} {})".format(1.0, score/1000)
+            write_atoms(f, CEvaluationLink(CPredicateNode(mode), link(proteins[prot1], proteins[prot2]), stv=stv))
+            write_atoms(g, CEvaluationLink(CPredicateNode(mode), link(genes[gene1], genes[gene2]), stv=stv))
+    return len(df_symmetric) + len(df_asymmetric)
+
+def import_string(actions=source, mapping_file=mapping, min_scores=(0,), modes=interaction_modes, chunksize=500000, delta=False):
     """
-    interaction_modes = ["catalysis","inhibition","expression","activation","binding","reaction","ptmod"]
-    symmetric = {}
+    With delta the import is skipped when the input files and options are unchanged
+    since the last incremental import, see incremental.py
+    """
+    print("started at " + str(datetime.datetime.now()))
+    actions_path = fetch(actions)
+    mapping_path = fetch(mapping_file)
+    state = incremental.fingerprint([actions_path, mapping_path], sorted(modes), list(min_scores),
+                                    converter_version, current_symbols.snapshot_id()) if delta else None
+    if state and incremental.unchanged('string', state):
+        return
+    mapping_dict = load_mapping(mapping_path)
+    print("Done with the Dict, importing into atomese")
+
+    df_data, notmapped = read_actions(actions_path, mapping_dict, modes, chunksize, min(min_scores))
+    print(len(df_data))
     if not os.path.exists(os.path.join(os.getcwd(), 'string_dataset')):
         os.makedirs('string_dataset')
-    with open("string_dataset/string_ppi_{}.scm".format(str(datetime.date.today())), "w") as f, open('string_dataset/string_ggi_{}.scm'.format(str(datetime.date.today())), 'w') as g:
-        for i in range(len(df_data_symmetric)):
-            try:
-                prot1 = df_data_symmetric.iloc[i]['item_id_a']
-                prot2 = df_data_symmetric.iloc[i]['item_id_b']
-                mode = df_data_symmetric.iloc[i]['mode']
-                if not mode in interaction_modes:
-                    continue
-                score = int(df_data_symmetric.iloc[i]['score'])               
-
-                if prot1 in mapping_dict.keys() and prot2 in mapping_dict.keys():
-                    prot1 = mapping_dict[prot1]
-                    prot2 = mapping_dict[prot2]
-                else:
-                    if not prot1 in mapping_dict.keys():
-                        notmapped.append(prot1)
-                    else:
-                        notmapped.append(prot2)
-                    continue
-                
-                protein1 = ProteinNode(prot1.split("|")[0])
-                gene1 = CGeneNode(prot1.split("|")[1].split("_")[0].upper()) 
-                protein2 = ProteinNode(prot2.split("|")[0])
-                gene2 = CGeneNode(prot2.split("|")[1].split("_")[0].upper())
-                stv = "(stv {} {})".format(1.0, score/1000)
-
-                f.write(CEvaluationLink(CPredicateNode(mode), CSetLink(protein1, protein2), stv=stv).recursive_print() + "\n")
-                g.write(CEvaluationLink(CPredicateNode(mode), CSetLink(gene1, gene2), stv=stv).recursive_print() + "\n")
-                symmetric[gene1.name + gene2.name] = mode
-
-            except Exception as e:
-                print(e)
-        for i in range(len(df_data_asymmetric)):
-            try:
-                prot1 = df_data_asymmetric.iloc[i]['item_id_a']
-                prot2 = df_data_asymmetric.iloc[i]['item_id_b']
-                mode = df_data_asymmetric.iloc[i]['mode']
-                if not mode in interaction_modes:
-                    continue
-                a_is_acting = df_data_asymmetric.iloc[i]['a_is_acting'] 
-                score = int(df_data_asymmetric.iloc[i]['score'])               
-
-                if prot1 in mapping_dict.keys() and prot2 in mapping_dict.keys():
-                    prot1 = mapping_dict[prot1]
-                    prot2 = mapping_dict[prot2]
-                else:
-                    if not prot1 in mapping_dict.keys():
-                        notmapped.append(prot1)
-                    else:
-                        notmapped.append(prot2)
-                    continue
-                
-                protein1 = ProteinNode(prot1.split("|")[0])
-                gene1 = CGeneNode(prot1.split("|")[1].split("_")[0].upper()) 
-                protein2 = ProteinNode(prot2.split("|")[0])
-                gene2 = CGeneNode(prot2.split("|")[1].split("_")[0].upper())
-                stv = "(stv {} {})".format(1.0, score/1000)
-
-                if not (gene1.name + gene2.name in symmetric.keys() and symmetric[gene1.name + gene2.name] == mode):
-                    if a_is_acting is "t": 
-                        f.write(CEvaluationLink(CPredicateNode(mode), CListLink(protein1, protein2), stv=stv).recursive_print() + "\n")
-                        g.write(CEvaluationLink(CPredicateNode(mode), CListLink(gene1, gene2), stv=stv).recursive_print() + "\n")
-                    else:
-                        f.write(CEvaluationLink(CPredicateNode(mode), CListLink(protein2, protein1), stv=stv).recursive_print() + "\n")
-                        g.write(CEvaluationLink(CPredicateNode(mode), CListLink(gene2, gene1), stv=stv).recursive_print() + "\n")
-
-            except Exception as e:
-                print(e)
-        
-        print("Done " + str(datetime.datetime.now()))
-        with open("string_dataset/notmapped_ensembles.txt", "w") as n:
-            n.write("\n".join(set(notmapped)))
+    proteins = {}
+    genes = {}
+    today = str(datetime.date.today())
+    outputs = {}
+    for min_score in min_scores:
+        suffix = "score{}_{}".format(min_score, today) if min_score else today
+        outputs["ppi_score{}".format(min_score)] = "string_dataset/string_ppi_{}.scm".format(suffix)
+        outputs["ggi_score{}".format(min_score)] = "string_dataset/string_ggi_{}.scm".format(suffix)
+        with open(outputs["ppi_score{}".format(min_score)], "w") as f, open(outputs["ggi_score{}".format(min_score)], 'w') as g:
+            written = convert(df_data, min_score, f, g, proteins, genes)
+        print("{} interactions with score >= {}".format(written, min_score))
+
+    print("Done " + str(datetime.datetime.now()))
+    with open("string_dataset/notmapped_ensembles.txt", "w") as n:
+        n.write("\n".join(set(notmapped)))
+    if state:
+        incremental.record('string', state, outputs, os.path.basename(actions_path))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='convert STRING protein actions to atomese')
+    parser.add_argument('--actions', type=str, default=source,
+                        help='url of the protein.actions file (STRING v11+)')
+    parser.add_argument('--mapping', type=str, default=mapping,
+                        help='url of the uniprot to string mapping file')
+    parser.add_argument('--min-score', type=int, nargs='+', default=[0],
+                        help='minimum combined score (0-1000), one output per value')
+    parser.add_argument('--modes', type=str, nargs='+', default=interaction_modes,
+                        help='interaction modes to import')
+    parser.add_argument('--chunksize', type=int, default=500000,
+                        help='number of rows of the actions file read at once')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip the import if the input is unchanged since the last incremental import, '
+                             'otherwise also write the added and removed atoms')
+    current_symbols.add_arguments(parser)
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    import_string()
\ No newline at end of file
+    """
+    usage:
+        python string_PPI.py
+        python string_PPI.py --min-score 400 700 900
+        python string_PPI.py --incremental
+    """
+    arguments = parse_args()
+    current_symbols.configure(arguments)
+    import_string(arguments.actions, arguments.mapping, arguments.min_score, arguments.modes, arguments.chunksize,
+                  arguments.incremental)